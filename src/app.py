@@ -14,9 +14,7 @@ import webbrowser
 import os
 
 from data_importers import DataIngestionFactory, DataPoint
-from lsh import MultiTableLSH
-from kd_tree import ApproximateKDTree
-from r_tree import RTree
+from spatial_index import available_engines, get_engine
 
 from config import SAMPLE_DATA
 
@@ -25,7 +23,7 @@ class InteractiveApp:
     def __init__(self, root):
         self.root = root
         self.root.title("Geospatial Search App")
-        self.root.geometry("500x250")
+        self.root.geometry("500x280")
 
         instructions = ("Enter coords, select algo, press Run, and a map should open in your browser.\n\n")
         tk.Label(root, text=instructions, justify="left").grid(row=0, column=0, columnspan=2, pady=5)
@@ -43,9 +41,10 @@ class InteractiveApp:
 
         # algo selection
         tk.Label(root, text="Algorithm:").grid(row=3, column=0, sticky='w')
-        self.algorithm_var = tk.StringVar(value="Multi-Table LSH")
+        engines = {get_engine(name).display_name: get_engine(name) for name in available_engines()}
+        algorithms = list(engines)
+        self.algorithm_var = tk.StringVar(value=algorithms[0])
 
-        algorithms = ["Multi-Table LSH", "Approximate KD-Tree", "R-Tree"]
         for i, algo in enumerate(algorithms):
             tk.Radiobutton(
                 root,
@@ -60,28 +59,16 @@ class InteractiveApp:
 
         # load data and init algos
         self.data_points = self.load_data()
-        self.algorithms = {
-            "Multi-Table LSH": self.init_lsh(),
-            "Approximate KD-Tree": self.init_kd_tree(),
-            "R-Tree": self.init_r_tree()
-        }
+        self.algorithms = {name: engine.build(self.data_points) for name, engine in engines.items()}
+
+    def close(self):
+        # stops any worker processes the indexes hold (see SpatialIndex.close)
+        for index in self.algorithms.values():
+            index.close()
 
     def load_data(self):
         file_path = os.path.join(SAMPLE_DATA)
-        return DataIngestionFactory.load_data(file_path)
-
-    def init_lsh(self):
-        lsh = MultiTableLSH(num_tables=3, hash_size=2)
-        lsh.insert(self.data_points)
-        return lsh
-
-    def init_kd_tree(self):
-        return ApproximateKDTree(self.data_points, max_depth=10)
-
-    def init_r_tree(self):
-        r_tree = RTree()
-        r_tree.insert(self.data_points)
-        return r_tree
+        return DataIngestionFactory.load_data(file_path, spatial_order='hilbert')
 
     def run_algorithm(self):
         try:
@@ -142,3 +129,4 @@ if __name__ == "__main__":
     root = tk.Tk()
     app = InteractiveApp(root)
     root.mainloop()
+    app.close()
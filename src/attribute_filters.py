@@ -0,0 +1,110 @@
+"""
+Attribute predicates for filtered k-NN / range queries, plus the per-node summaries that let the trees skip
+whole subtrees that can't hold a matching pt.
+
+A predicate is an (attribute, op, value) tuple and a query takes a list of them (all must hold), e.g.
+    [('population', '>', 10_000), ('timezone', '==', 'America/New_York')]
+Ops: '<', '<=', '>', '>=', '==', '!=', 'in'. Pts missing the attribute (or w/ None) never match.
+
+A summary maps each attribute to ('num', min, max) for numeric values or ('cat', {values}) for anything else
+(i.e. a small value set, the equivalent of a bitmap), or ('cat', None) if a subtree mixes the two (can't prune).
+"""
+
+import operator
+from numbers import Number
+
+OPS = {
+    '<':  operator.lt,
+    '<=': operator.le,
+    '>':  operator.gt,
+    '>=': operator.ge,
+    '==': operator.eq,
+    '!=': operator.ne,
+    'in': lambda x, values: x in values,
+}
+
+
+def _is_num(value):
+    return isinstance(value, Number)
+
+
+def matches(point, predicates) -> bool:
+    """True if the pt satisfies every predicate."""
+    attributes = point.attributes or {}
+    for attr, op, value in predicates:
+        x = attributes.get(attr)
+        if x is None:
+            return False
+        try:
+            if not OPS[op](x, value):
+                return False
+        except TypeError:  # e.g. comparing a str to an int
+            return False
+    return True
+
+
+def point_summary(point) -> dict:
+    return {attr: ('num', x, x) if _is_num(x) else ('cat', {x})
+            for attr, x in (point.attributes or {}).items() if x is not None}
+
+
+def merge_into(merged: dict, summary: dict):
+    """Merges summary into merged in place (value sets are copied the first time an attr shows up in merged)."""
+    for attr, entry in summary.items():
+        current = merged.get(attr)
+        if current is None:
+            merged[attr] = entry if entry[0] == 'num' or entry[1] is None else ('cat', set(entry[1]))
+        elif current[0] == 'num' and entry[0] == 'num':
+            if entry[1] < current[1] or entry[2] > current[2]:
+                merged[attr] = ('num', min(current[1], entry[1]), max(current[2], entry[2]))
+        elif current[0] == 'cat' and entry[0] == 'cat' and current[1] is not None and entry[1] is not None:
+            current[1].update(entry[1])
+        else:
+            merged[attr] = ('cat', None)  # mixed types, don't try to prune on this attr
+
+
+def merge_summaries(summaries) -> dict:
+    merged = {}
+    for summary in summaries:
+        merge_into(merged, summary)
+    return merged
+
+
+def _entry_may_match(entry, op, value) -> bool:
+    if entry[0] == 'num':
+        lo, hi = entry[1], entry[2]
+        if op == 'in':
+            return any(_is_num(v) and lo <= v <= hi for v in value)
+        if not _is_num(value):
+            return op == '!='
+        return {'<':  lo < value,
+                '<=': lo <= value,
+                '>':  hi > value,
+                '>=': hi >= value,
+                '==': lo <= value <= hi,
+                '!=': not (lo == hi == value)}[op]
+
+    values = entry[1]
+    if values is None:
+        return True
+    if op == '==':
+        return value in values
+    if op == '!=':
+        return values != {value}
+    if op == 'in':
+        return not values.isdisjoint(value)
+    try:
+        return any(OPS[op](x, value) for x in values)
+    except TypeError:
+        return True
+
+
+def may_match(summary, predicates) -> bool:
+    """False only if no pt summarized by `summary` can satisfy the predicates (i.e. safe to prune)."""
+    if summary is None:
+        return True
+    for attr, op, value in predicates:
+        entry = summary.get(attr)
+        if entry is None or not _entry_may_match(entry, op, value):
+            return False
+    return True
@@ -0,0 +1,90 @@
+"""
+Picks an engine + params for a dataset instead of sweeping them by hand.
+Runs a fast, sampled version of the benchmark (benchmark.py) over every registered engine and every combination of
+its tuning_params, then returns the cheapest configuration (lowest avg query time) that meets the targets:
+a minimum recall@k and/or a max avg query time. The result can be saved as json and later built w/ build_tuned().
+"""
+
+import os
+import json
+import itertools
+import numpy as np
+import logging as log
+
+from benchmark import benchmark, ground_truth_sets
+from data_importers import DataIngestionFactory, DataPoint
+from spatial_index import SpatialIndex, available_engines, get_engine
+
+from config import SAMPLE_DATA
+
+
+def _param_grid(engine) -> list[dict]:
+    # an engine w/o tuning_params is scored once w/ its default_params
+    names = list(engine.tuning_params)
+    return [dict(zip(names, values)) for values in itertools.product(*(engine.tuning_params[n] for n in names))]
+
+
+def auto_tune(data_points: list[DataPoint], target_recall: float = 0.95, max_query_time: float = None,
+              k: int = 5, sample_size: int = 20_000, num_queries: int = 50, engines: list[str] = None,
+              output_path: str = None, seed: int = 0) -> dict:
+    """
+    Returns {'engine', 'params', 'query_time', 'recall', 'build_time'} for the cheapest config meeting the targets.
+    If nothing meets them, falls back to the config w/ the best recall (a warning is logged).
+    output_path: if given, the result is also written there as json.
+    Raises ValueError if there's nothing to tune (no engines given / no data).
+    """
+    engines = available_engines() if engines is None else engines
+    if not engines:
+        raise ValueError("auto_tune needs at least one engine to try")
+    if not data_points:
+        raise ValueError("auto_tune needs data pts to tune on")
+    rng = np.random.default_rng(seed)
+    if len(data_points) > sample_size:
+        data_points = [data_points[i] for i in rng.choice(len(data_points), sample_size, replace=False)]
+    # one query set and one brute force pass, shared by every config
+    query_points = [data_points[i] for i in rng.choice(len(data_points), min(num_queries, len(data_points)),
+                                                       replace=False)]
+    ground_truth = ground_truth_sets(data_points, query_points, k)
+
+    results = []
+    for name in engines:
+        engine = get_engine(name)
+        for params in _param_grid(engine):
+            # closed right after scoring, so e.g. sharded configs don't keep their worker processes around
+            with engine.build(data_points, **params) as index:
+                query_time, recall = benchmark(index, data_points, k=k, query_points=query_points,
+                                               ground_truth=ground_truth)
+            results.append({'engine': name, 'params': index.params, 'query_time': query_time,
+                            'recall': recall, 'build_time': index.build_time})
+            log.debug(f"{engine.display_name} {params} - Time: {query_time:.5f}s, Recall@{k}: {recall:.2f}")
+
+    meets_targets = [r for r in results if r['recall'] >= target_recall
+                     and (max_query_time is None or r['query_time'] <= max_query_time)]
+    if meets_targets:
+        best = min(meets_targets, key=lambda r: (r['query_time'], r['build_time']))
+    else:
+        best = max(results, key=lambda r: (r['recall'], -r['query_time']))
+        log.warning(f"No config met recall >= {target_recall}"
+                    f"{f' and query time <= {max_query_time}s' if max_query_time else ''}, using best recall")
+    log.info(f"Tuned: {best['engine']} {best['params']} - "
+             f"Time: {best['query_time']:.5f}s, Recall@{k}: {best['recall']:.2f}")
+
+    if output_path:
+        with open(output_path, 'w') as f:
+            json.dump(best, f, indent=2)
+    return best
+
+
+def build_tuned(data_points: list[DataPoint], config_path: str) -> SpatialIndex:
+    """Builds the index described by a json file written by auto_tune()."""
+    with open(config_path) as f:
+        config = json.load(f)
+    return get_engine(config['engine']).build(data_points, **config['params'])
+
+
+if __name__ == '__main__':
+    log.basicConfig(level=log.INFO)
+    file_path = os.path.join(SAMPLE_DATA)
+    data_points = DataIngestionFactory.load_data(file_path, spatial_order='hilbert')
+
+    auto_tune(data_points, target_recall=0.95, output_path=os.path.splitext(file_path)[0] + '_tuned.json')
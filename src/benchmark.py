@@ -6,9 +6,7 @@ This is also the script that is run via Docker.
 import os
 import time
 import numpy as np
-from lsh import MultiTableLSH
-from kd_tree import ApproximateKDTree
-from r_tree import RTree
+from spatial_index import available_engines, get_engine
 
 from data_importers import DataIngestionFactory
 import logging as log
@@ -16,21 +14,34 @@ import logging as log
 from config import SAMPLE_DATA
 
 
-def brute_force_search(data_points, query_point, k=5):
-    """Brute search against which other algos are benchmarked, i.e. the 'ground truth'..."""
-    return sorted(data_points, key=lambda p: np.linalg.norm(np.array(p.as_vector()) - np.array(query_point.as_vector())))[:k]
+def ground_truth_sets(data_points, query_points, k=5):
+    """Zip codes of the exact k nearest neighbors of each query pt (brute force), i.e. the 'ground truth'..."""
+    coords = np.array([p.as_vector() for p in data_points], dtype=np.float64)
+    zip_codes = np.array([p.zip_code for p in data_points], dtype=object)
+    truth = []
+    for query_point in query_points:
+        diffs = coords - np.array(query_point.as_vector(), dtype=np.float64)
+        dists = np.einsum('ij,ij->i', diffs, diffs)
+        nearest = np.argpartition(dists, k)[:k] if len(dists) > k else np.arange(len(dists))
+        truth.append(set(zip_codes[nearest].tolist()))
+    return truth
+
+def benchmark(algorithm, data_points, num_queries=100, k=5, query_points=None, ground_truth=None):
+    """
+    Assess speed and accuracy...
+    query_points / ground_truth: pass them in (see ground_truth_sets) to score several indexes on the same queries
+    w/o redoing the brute force each time; otherwise num_queries random pts are used.
+    """
+    if query_points is None:
+        query_points = np.random.choice(data_points, num_queries, replace=False)
+    if ground_truth is None:
+        ground_truth = ground_truth_sets(data_points, query_points, k)
+    num_queries = len(query_points)
 
-def benchmark(algorithm, data_points, num_queries=100, k=5):
-    """Assess speed and accuracy..."""
-    query_points = np.random.choice(data_points, num_queries, replace=False)
-    
     total_time = 0
     correct_retrievals = 0  # Relative to brute force ground truth.
 
-    for query_point in query_points:
-        # brute foce...
-        ground_truth = set(p.zip_code for p in brute_force_search(data_points, query_point, k))
-
+    for query_point, truth in zip(query_points, ground_truth):
         # Measure time
         start_time = time.time()
         results = algorithm.query(query_point, k)
@@ -38,7 +49,7 @@ def benchmark(algorithm, data_points, num_queries=100, k=5):
 
         # Measure acc
         retrieved_zips = set(p.zip_code for p in results)
-        correct_retrievals += len(retrieved_zips & ground_truth) / k
+        correct_retrievals += len(retrieved_zips & truth) / k
 
     avg_query_time = total_time / num_queries
     avg_accuracy = correct_retrievals / num_queries
@@ -46,32 +57,21 @@ def benchmark(algorithm, data_points, num_queries=100, k=5):
     return avg_query_time, avg_accuracy
 
 
-def sample_data_benchmark():
-    """Benchmark LSH, KD-Tree, and R-Tree algos..."""
+def sample_data_benchmark(engines: list[str] = None):
+    """Benchmark every registered engine (LSH, KD-Tree, R-Tree, Grid Index, ...) or just the given ones..."""
     file_path = os.path.join(SAMPLE_DATA)
-    data_points = DataIngestionFactory.load_data(file_path)
-    
-    # K-D Tree
-    approx_kd_tree = ApproximateKDTree(data_points, max_depth=10)
-    kd_time, kd_accuracy = benchmark(approx_kd_tree, data_points)
-    log.info(f"Approximate KD Tree - Time: {kd_time:.5f}s, Accuracy: {kd_accuracy:.2f}")
-
-    # LSH #
-    lsh = MultiTableLSH(num_tables=3, hash_size=2)
-    lsh.insert(data_points)
-    lsh_time, lsh_accuracy = benchmark(lsh, data_points)
-    log.info(f"Multi-Table LSH - Time: {lsh_time:.5f}s, Accuracy: {lsh_accuracy:.2f}")
-
-    # R-Tree #
-    # max_children is the max num of children the node can hold before needing to split...
-    # adjusting this allows you to choose a trade off between speed and accuracy
-    # values around 128 will approach 100% accuracy but will be slighly slower
-    # min value is 2, which yields an accuracy of about 43%.
-    r_tree = RTree(max_children=64)  
-    r_tree.insert(data_points)
-
-    rtree_time, rtree_accuracy = benchmark(r_tree, data_points)
-    log.info(f"R-Tree - Time: {rtree_time:.5f}s, Accuracy: {rtree_accuracy:.2f}")
+    # Hilbert order keeps spatially close pts adjacent in memory / build order (see data_importers.spatially_sorted)
+    data_points = DataIngestionFactory.load_data(file_path, spatial_order='hilbert')
+    # same queries (and brute force answers) for every engine
+    query_points = np.random.choice(data_points, 100, replace=False)
+    ground_truth = ground_truth_sets(data_points, query_points)
+
+    # Each engine is built w/ its default_params (see the engine classes for what they trade off)
+    for name in engines or available_engines():
+        engine = get_engine(name)
+        with engine.build(data_points) as index:
+            query_time, accuracy = benchmark(index, data_points, query_points=query_points, ground_truth=ground_truth)
+        log.info(f"{engine.display_name} - Time: {query_time:.5f}s, Accuracy: {accuracy:.2f}")
 
 
 if __name__ == "__main__":
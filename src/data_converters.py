@@ -1,57 +1,167 @@
 """
 File mostly just used for experimenting and preprocessing...
+
+Converts .pbf files (from OSM) into .csv and/or a compressed columnar .npz file.
+Parsing/decompression of the PBF blocks happens in libosmium's own thread pool (size can be set with the
+OSMIUM_POOL_THREADS env var), the zip_code tag filter is applied inside the reader, and batches are handed to a
+background writer thread, so the main thread only touches the (few) nodes that are actually kept.
 """
 
 import osmium  # used for parsing OSM files...
+import numpy as np
 import csv
 import os
+import time
+import queue
+import zipfile
+import threading
+import logging as log
+
+
+class ColumnarWriter:
+    """
+    Appends batches of columns to a .npz (i.e. zip of .npy) file, one compressed member per column per batch.
+    Since every batch is its own member the file can be written incrementally; read it back w/ load_columnar().
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.zf = zipfile.ZipFile(path, 'w', compression=zipfile.ZIP_DEFLATED, compresslevel=1)
+        self.num_batches = 0
 
+    def write_batch(self, columns: dict[str, np.ndarray]):
+        for name, array in columns.items():
+            with self.zf.open(f"{name}_{self.num_batches:06d}.npy", 'w', force_zip64=True) as f:
+                np.lib.format.write_array(f, np.ascontiguousarray(array), allow_pickle=False)
+        self.num_batches += 1
 
-class DataPoint:
-    def __init__(self, latitude: float, longitude: float, zip_code: str):
-        self.latitude = latitude
-        self.longitude = longitude
-        self.zip_code = zip_code
+    def close(self):
+        self.zf.close()
+
+
+def load_columnar(path: str) -> dict[str, np.ndarray]:
+    """Reads a file written by ColumnarWriter back into one array per column."""
+    batches = {}
+    with zipfile.ZipFile(path) as zf:
+        for member in sorted(zf.namelist()):
+            name = member.rsplit('_', 1)[0]
+            with zf.open(member) as f:
+                batches.setdefault(name, []).append(np.lib.format.read_array(f, allow_pickle=False))
+    return {name: np.concatenate(arrays) for name, arrays in batches.items()}
 
 
 class PBFToCSVConverter:
-    def __init__(self, input_pbf: str, output_csv: str):
+    def __init__(self, input_pbf: str, output_csv: str = None, output_columnar: str = None,
+                 batch_size: int = 100_000, bbox: tuple[float, float, float, float] = None):
+        """
+        output_csv / output_columnar: either (or both) may be given.
+        bbox: optional (min_lon, min_lat, max_lon, max_lat); nodes outside it are dropped.
+        """
+        if output_csv is None and output_columnar is None:
+            raise ValueError("Need at least one of output_csv or output_columnar")
         self.input_pbf = input_pbf
         self.output_csv = output_csv
+        self.output_columnar = output_columnar
+        self.batch_size = batch_size
+        self.bbox = bbox
+
+    def _read_batches(self):
+        # Only nodes w/ a zip_code tag ever reach Python...
+        processor = osmium.FileProcessor(self.input_pbf, osmium.osm.NODE)\
+                          .with_filter(osmium.filter.KeyFilter('zip_code'))
+
+        lats, lons, zips = [], [], []
+        for n in processor:
+            loc = n.location
+            if not loc.valid():
+                continue
+            lat, lon = loc.lat, loc.lon
+            if self.bbox and not (self.bbox[0] <= lon <= self.bbox[2] and self.bbox[1] <= lat <= self.bbox[3]):
+                continue
+            lats.append(lat)
+            lons.append(lon)
+            zips.append(n.tags.get('zip_code'))
+            if len(lats) >= self.batch_size:
+                yield lats, lons, zips
+                lats, lons, zips = [], [], []
+        if lats:
+            yield lats, lons, zips
 
-    class OSMHandler(osmium.SimpleHandler):
-        def __init__(self):
-            super().__init__()
-            self.data_points = []
+    def _write_batches(self, batch_queue: queue.Queue, csvfile, columnar, stop: threading.Event, errors: list):
+        try:
+            if csvfile:
+                writer = csv.writer(csvfile)
+                writer.writerow(['latitude', 'longitude', 'zip_code'])
+            while (batch := batch_queue.get()) is not None:
+                lats, lons, zips = batch
+                if csvfile:
+                    writer.writerows(zip(lats, lons, zips))
+                if columnar:
+                    columnar.write_batch({'latitude':  np.array(lats, dtype=np.float64),
+                                          'longitude': np.array(lons, dtype=np.float64),
+                                          'zip_code':  np.array(zips, dtype=np.str_)})
+        except Exception as e:
+            errors.append(e)
+            stop.set()  # tells the reader to give up
+            while batch_queue.get() is not None:  # drain so the reader doesn't block on a full queue meanwhile
+                pass
 
-        def node(self, n):
-            print(f"Node ID: {n.id}, Tags: {dict(n.tags)}") 
-            if 'zip_code' in n.tags: 
-                self.data_points.append(DataPoint(
-                    latitude=n.location.lat,
-                    longitude=n.location.lon,
-                    zip_code=n.tags.get('zip_code')
-                ))
+    def convert(self) -> int:
+        """Runs the conversion and returns the number of nodes written."""
+        log.info(f"Processing PBF file: {self.input_pbf}")
+        start_time = time.time()
 
-    def convert(self):
+        # Outputs are opened here (not in the writer thread) so e.g. a bad path fails before any reading starts
+        csvfile = open(self.output_csv, 'w', newline='') if self.output_csv else None
+        try:
+            columnar = ColumnarWriter(self.output_columnar) if self.output_columnar else None
+        except Exception:
+            if csvfile:
+                csvfile.close()
+            raise
 
-        handler = self.OSMHandler()
-        print(f"Processing PBF file: {self.input_pbf}")
-        handler.apply_file(self.input_pbf)
+        # Bounded so a slow disk applies back pressure instead of buffering the whole extract...
+        batch_queue = queue.Queue(maxsize=4)
+        stop = threading.Event()
+        errors = []
+        writer_thread = threading.Thread(target=self._write_batches,
+                                         args=(batch_queue, csvfile, columnar, stop, errors),
+                                         name='pbf-writer', daemon=True)
+        writer_thread.start()
 
-        print(f"Writing to CSV file: {self.output_csv}")
-        with open(self.output_csv, 'w', newline='') as csvfile:
-            writer = csv.writer(csvfile)
-            writer.writerow(['latitude', 'longitude', 'zip_code'])
-            for dp in handler.data_points:
-                writer.writerow([dp.latitude, dp.longitude, dp.zip_code])
+        num_nodes = 0
+        try:
+            for batch in self._read_batches():
+                if stop.is_set():
+                    break  # writer failed, no point reading the rest of the extract
+                num_nodes += len(batch[0])
+                batch_queue.put(batch)
+        finally:
+            batch_queue.put(None)
+            writer_thread.join()
+            if csvfile:
+                csvfile.close()
+            if columnar:
+                columnar.close()
+        if errors:
+            raise errors[0]
 
-        print(f"Conversion completed. Output saved to {self.output_csv}")
+        elapsed = max(time.time() - start_time, 1e-9)
+        size_mb = os.path.getsize(self.input_pbf) / 1e6
+        log.info(f"Conversion completed: {num_nodes} nodes in {elapsed:.2f}s "
+                 f"({num_nodes / elapsed:,.0f} nodes/s, {size_mb / elapsed:.1f} MB/s of PBF)")
+        for path in (self.output_csv, self.output_columnar):
+            if path:
+                log.info(f"Output saved to {path}")
+        return num_nodes
 
 
 if __name__ == "__main__":
-    input_pbf_path = os.path.join("other_data", "us-virgin-islands-latest.osm.pbf") 
-    output_csv_path = os.path.join("other_data", "us-virgin-islands-latest.csv") 
+    log.basicConfig(level=log.INFO)
+    input_pbf_path = os.path.join("other_data", "us-virgin-islands-latest.osm.pbf")
+    output_csv_path = os.path.join("other_data", "us-virgin-islands-latest.csv")
+    output_columnar_path = os.path.join("other_data", "us-virgin-islands-latest.npz")
 
-    converter = PBFToCSVConverter(input_pbf=input_pbf_path, output_csv=output_csv_path)
+    converter = PBFToCSVConverter(input_pbf=input_pbf_path, output_csv=output_csv_path,
+                                  output_columnar=output_columnar_path)
     converter.convert()
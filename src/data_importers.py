@@ -4,55 +4,209 @@ Imports data from either .pbf files (from OSM) or .csv
 https://mygeodata.cloud/converter/pbf-to-csv
 
 NOTE: I experimented with including timezone and population data, but it was too sparse to be useful...
+      Extra columns like these can still be loaded as per-pt attributes for filtered queries (see attribute_filters.py)
 """
 
 import osmium  # used for parsing OSM (Open Street Map) files
+import numpy as np
 import csv
 import os
+import io
+import gzip
+import itertools
+import logging as log
 from typing import List, Dict, Union
 
+CSV_EXTENSIONS = ('.csv', '.csv.gz', '.csv.zst')
+CSV_CACHE_SUFFIX = '.cache.npz'  # parsed columns are cached next to the csv, e.g. uszips.csv.cache.npz
+CSV_COLUMNS = ('zip', 'lat', 'lng')
+CSV_CACHE_VERSION = 2  # bumped whenever the cached columns change (2: zip codes no longer cut at 16 chars)
+
+
+def _open_text(file_path: str):
+    """Opens a (possibly gzip / zstd compressed) text file for reading."""
+    if file_path.endswith('.gz'):
+        return gzip.open(file_path, 'rt', newline='')
+    if file_path.endswith('.zst'):
+        try:
+            import zstandard  # optional, only needed for .zst inputs
+        except ImportError:
+            raise ImportError("Reading .zst files needs the zstandard package (pip install zstandard)") from None
+        return io.TextIOWrapper(zstandard.ZstdDecompressor().stream_reader(open(file_path, 'rb')), newline='')
+    return open(file_path, 'r', newline='')
+
+
+def file_signature(file_path: str) -> tuple[int, int]:
+    """(size, mtime in ns) of a file; what the csv cache and incremental builds use to tell if it changed."""
+    stat = os.stat(file_path)
+    return stat.st_size, stat.st_mtime_ns
+
 
 class DataPoint:
     def __init__(self, latitude: float, longitude: float, zip_code: Union[str, int], 
-                #  timezone: str='', population: int=0
-                 ):
+                 point_id: int = None, attributes: Dict[str, Union[str, int, float]] = None):
         self.latitude   = latitude
         self.longitude  = longitude
         self.zip_code   = zip_code
-        # self.timezone   = timezone
-        # self.population = population
+        self.point_id   = point_id  # row num (csv) or OSM node id (pbf), survives any reordering
+        self.attributes = attributes  # e.g. {'population': 12000, 'timezone': ...}; None if there are none
 
     def as_vector(self):
         return [self.longitude, self.latitude]  # shoudl be able to add more dims here later
 
+def points_to_arrays(points: List[DataPoint]) -> tuple:
+    """
+    Packs pts into (coords, zip_codes, point_ids, attributes): (n, 2) float64 [lon, lat] rows, utf-8 zip codes
+    (b'' for None), int64 ids (None unless every pt has one) and a list of attribute dicts (None unless any pt
+    has some). Much smaller (and cheaper to pickle) than the DataPoints; points_from_arrays() is the inverse.
+    """
+    coords = np.array([p.as_vector() for p in points], dtype=np.float64).reshape(len(points), 2)
+    zip_codes = np.array([b'' if p.zip_code is None else str(p.zip_code).encode() for p in points], dtype=np.bytes_)
+    ids = [p.point_id for p in points]
+    point_ids = np.array(ids, dtype=np.int64) if points and None not in ids else None
+    attributes = [p.attributes for p in points] if any(p.attributes for p in points) else None
+    return coords, zip_codes, point_ids, attributes
+
+def points_from_arrays(coords: np.ndarray, zip_codes: np.ndarray, point_ids: np.ndarray = None,
+                       attributes: list = None) -> List[DataPoint]:
+    return [DataPoint(latitude=lat, longitude=lon, zip_code=zip_code.decode() or None,
+                      point_id=None if point_ids is None else int(point_ids[i]),
+                      attributes=None if attributes is None else attributes[i])
+            for i, ((lon, lat), zip_code) in enumerate(zip(coords.tolist(), zip_codes.tolist()))]
+
 #... tryin to accommodate various data source types...
 class DataIngestionFactory: 
     @staticmethod
-    def load_data(file_path: str) -> List[DataPoint]:
-        if file_path.endswith('.csv'):
-            return DataIngestionFactory._load_from_csv(file_path)
+    def load_data(file_path: str, spatial_order: str = None, attributes: tuple[str] = ()) -> List[DataPoint]:
+        """
+        spatial_order: None (file order), 'hilbert', or 'morton'; see spatially_sorted().
+        attributes:    extra csv columns (or OSM tags for .osm.pbf) to keep as DataPoint.attributes
+                       (e.g. ('population', 'timezone')).
+        """
+        if file_path.endswith(CSV_EXTENSIONS):
+            if attributes:
+                data = DataIngestionFactory._load_from_csv(file_path, attributes)
+            else:
+                data = DataIngestionFactory._load_from_csv_fast(file_path)
         elif file_path.endswith('.osm.pbf'):
-            return DataIngestionFactory._load_from_pbf(file_path)
+            data = DataIngestionFactory._load_from_pbf(file_path, attributes)
         else:
             raise ValueError("Unsupported file format")
+        if spatial_order:
+            data, _ = spatially_sorted(data, curve=spatial_order)
+        return data
 
     @staticmethod
-    def _load_from_csv(file_path: str) -> List[DataPoint]:
+    def _parse_attribute(value: str) -> Union[str, int, float, None]:
+        # empty -> None (never matches a filter), numbers -> int/float, anything else stays a str
+        if value == '':
+            return None
+        for cast in (int, float):
+            try:
+                return cast(value)
+            except ValueError:
+                pass
+        return value
+
+    @staticmethod
+    def _load_from_csv(file_path: str, attributes: tuple[str] = ()) -> List[DataPoint]:
         data = []
-        with open(file_path, 'r') as csvfile:
+        with _open_text(file_path) as csvfile:
             reader = csv.DictReader(csvfile)
-            for row in reader:
+            for i, row in enumerate(reader):
                 data.append(DataPoint(
                         latitude=float(row['lat']), 
                         longitude=float(row['lng']), 
                         zip_code=row['zip'],
-                        # timezone=row['timezone'] if row['timezone'] else 'Unknown',
-                        # population=int(row['population']) if row['population'].isdigit() else 0
+                        point_id=i,
+                        attributes={a: DataIngestionFactory._parse_attribute(row[a]) for a in attributes},
                     ))
         return data
 
     @staticmethod
-    def _load_from_pbf(file_path: str) -> List[DataPoint]:
+    def load_csv_columns(file_path: str, chunk_size: int = 1_000_000, cache: bool = True) -> Dict[str, np.ndarray]:
+        """
+        Reads just the zip/lat/lng columns into arrays w/ numpy's C parser, chunk_size rows at a time.
+        If cache, the result is also saved to a sidecar file (file_path + CSV_CACHE_SUFFIX) that is reused as long
+        as the csv's size and mtime haven't changed, so later starts skip parsing entirely.
+        """
+        source_key = np.array([*file_signature(file_path), CSV_CACHE_VERSION], dtype=np.int64)
+        cache_path = file_path + CSV_CACHE_SUFFIX
+        if cache and os.path.exists(cache_path):
+            with np.load(cache_path) as cached:
+                if np.array_equal(cached['source'], source_key):
+                    return {name: cached[name] for name in CSV_COLUMNS}
+
+        with _open_text(file_path) as f:
+            header = next(csv.reader([f.readline()]))
+            columns = DataIngestionFactory._parse_csv_lines(f, header, chunk_size)
+
+        if cache:
+            # write then rename so a half written cache is never picked up
+            tmp_path = cache_path + '.tmp'
+            try:
+                with open(tmp_path, 'wb') as f:
+                    np.savez(f, source=source_key, **columns)
+                os.replace(tmp_path, cache_path)
+            except OSError as e:
+                # e.g. a read-only data dir or a full disk; the cache is only an optimization
+                log.warning(f"Couldn't write csv cache {cache_path}: {e}")
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+        return columns
+
+    @staticmethod
+    def read_csv_columns_from(file_path: str, offset: int = 0,
+                              chunk_size: int = 1_000_000) -> tuple[Dict[str, np.ndarray], int]:
+        """
+        Like load_csv_columns (w/o the cache) but only parses the complete lines after byte `offset` of an
+        uncompressed csv (0 = from the first row). Also returns the offset just past the last complete line,
+        i.e. where to resume once more rows have been appended.
+        """
+        with open(file_path, 'rb') as f:
+            header = next(csv.reader([f.readline().decode()]))
+            end = max(offset, f.tell())
+            f.seek(end)
+
+            def complete_lines():
+                nonlocal end
+                for line in f:
+                    if not line.endswith(b'\n'):
+                        break  # last line still being written, leave it for next time
+                    end += len(line)
+                    yield line.decode()
+
+            columns = DataIngestionFactory._parse_csv_lines(complete_lines(), header, chunk_size)
+        return columns, end
+
+    @staticmethod
+    def _parse_csv_lines(lines, header: list[str], chunk_size: int) -> Dict[str, np.ndarray]:
+        # zip/lat/lng columns of the given csv lines, parsed by numpy chunk_size lines at a time
+        usecols = tuple(header.index(name) for name in CSV_COLUMNS)
+        # zip codes as python strs first, a fixed width 'U' field would silently cut longer values
+        dtype = [('zip', 'O'), ('lat', 'f8'), ('lng', 'f8')]
+        chunks = []
+        lines = iter(lines)
+        while chunk := list(itertools.islice(lines, chunk_size)):
+            chunks.append(np.loadtxt(chunk, delimiter=',', quotechar='"', usecols=usecols, dtype=dtype, ndmin=1))
+        rows = np.concatenate(chunks) if chunks else np.zeros(0, dtype=dtype)
+        # ... then as a 'U' array as wide as the longest one (no pickling needed for the cache)
+        return {'zip': np.array(rows['zip'].tolist(), dtype=np.str_),
+                'lat': np.ascontiguousarray(rows['lat']), 'lng': np.ascontiguousarray(rows['lng'])}
+
+    @staticmethod
+    def _load_from_csv_fast(file_path: str) -> List[DataPoint]:
+        return DataIngestionFactory.points_from_columns(DataIngestionFactory.load_csv_columns(file_path))
+
+    @staticmethod
+    def points_from_columns(columns: Dict[str, np.ndarray], first_id: int = 0) -> List[DataPoint]:
+        """DataPoints from zip/lat/lng columns; point_id is the row num (counting from first_id)."""
+        return [DataPoint(latitude=lat, longitude=lng, zip_code=zip_code, point_id=i)
+                for i, (zip_code, lat, lng) in enumerate(zip(columns['zip'].tolist(), columns['lat'].tolist(),
+                                                              columns['lng'].tolist()), start=first_id)]
+
+    @staticmethod
+    def _load_from_pbf(file_path: str, attributes: tuple[str] = ()) -> List[DataPoint]:
         class OSMHandler(osmium.SimpleHandler):
             def __init__(self):
                 super().__init__()
@@ -61,9 +215,76 @@ class DataIngestionFactory:
             def node(self, n):
                 if 'zip_code' in n.tags:
                     zip_code = n.tags.get('zip_code')
-                    self.data.append(DataPoint(n.location.lat, n.location.lon, zip_code))
+                    # missing tags -> None, like empty csv cells
+                    attrs = {a: DataIngestionFactory._parse_attribute(n.tags.get(a, '')) for a in attributes} \
+                            if attributes else None
+                    self.data.append(DataPoint(n.location.lat, n.location.lon, zip_code, point_id=n.id,
+                                               attributes=attrs))
 
         handler = OSMHandler()
         handler.apply_file(file_path)
         return handler.data
-    
\ No newline at end of file
+    
+
+
+# Space filling curves...
+# Sorting pts by curve key puts spatially close pts next to each other in memory (and in index build order),
+# so leaf scans and tree builds touch far fewer cache lines / pages than w/ zip-code (file) order.
+
+def _quantize(coords: np.ndarray, bits: int) -> tuple[np.ndarray, np.ndarray]:
+    # Map lon/lat onto a 2^bits x 2^bits integer grid over the data's bounding box
+    mins, maxs = coords.min(axis=0), coords.max(axis=0)
+    scale = ((1 << bits) - 1) / np.maximum(maxs - mins, 1e-12)
+    q = ((coords - mins) * scale).astype(np.uint64)
+    return q[:, 0], q[:, 1]
+
+def _part1by1(v: np.ndarray) -> np.ndarray:
+    # Spread the low 32 bits of v out to the even bit positions
+    v = v & np.uint64(0x00000000FFFFFFFF)
+    v = (v | (v << np.uint64(16))) & np.uint64(0x0000FFFF0000FFFF)
+    v = (v | (v << np.uint64(8)))  & np.uint64(0x00FF00FF00FF00FF)
+    v = (v | (v << np.uint64(4)))  & np.uint64(0x0F0F0F0F0F0F0F0F)
+    v = (v | (v << np.uint64(2)))  & np.uint64(0x3333333333333333)
+    v = (v | (v << np.uint64(1)))  & np.uint64(0x5555555555555555)
+    return v
+
+def morton_keys(coords: np.ndarray, bits: int = 32) -> np.ndarray:
+    """Z-order key per (lon, lat) row: the bits of x and y interleaved."""
+    x, y = _quantize(coords, bits)
+    return _part1by1(x) | (_part1by1(y) << np.uint64(1))
+
+def hilbert_keys(coords: np.ndarray, bits: int = 16) -> np.ndarray:
+    """Hilbert curve distance per (lon, lat) row (better locality than Z-order, no big jumps)."""
+    x, y = _quantize(coords, bits)
+    n = np.uint64(1 << bits)
+    d = np.zeros(len(coords), dtype=np.uint64)
+    s = n >> np.uint64(1)
+    while s > 0:
+        rx = ((x & s) > 0).astype(np.uint64)
+        ry = ((y & s) > 0).astype(np.uint64)
+        d += s * s * ((np.uint64(3) * rx) ^ ry)
+        # rotate the quadrant so the curve stays continuous...
+        flip = (ry == 0) & (rx == 1)
+        x = np.where(flip, n - np.uint64(1) - x, x)
+        y = np.where(flip, n - np.uint64(1) - y, y)
+        swap = ry == 0
+        x, y = np.where(swap, y, x), np.where(swap, x, y)
+        s >>= np.uint64(1)
+    return d
+
+def spatially_sorted(data_points: List[DataPoint], curve: str = 'hilbert') -> tuple[List[DataPoint], np.ndarray]:
+    """
+    Returns the pts sorted by space filling curve key, plus the permutation used,
+    i.e. sorted_points[i] is data_points[permutation[i]] (np.argsort(permutation) maps back).
+    """
+    if not data_points:
+        return [], np.zeros(0, dtype=np.int64)
+    coords = np.array([p.as_vector() for p in data_points], dtype=np.float64)
+    if curve == 'hilbert':
+        keys = hilbert_keys(coords)
+    elif curve == 'morton':
+        keys = morton_keys(coords)
+    else:
+        raise ValueError(f"Unsupported curve: {curve}")
+    permutation = np.argsort(keys, kind='stable')
+    return [data_points[i] for i in permutation], permutation
@@ -0,0 +1,186 @@
+"""
+Implementation of a uniform grid index (a flat 'bucket' grid over lon/lat).
+Points are sorted by cell and stored CSR-style, i.e. one contiguous coordinate array plus a cell offset array,
+so all points of cell c are coords[cell_offsets[c]:cell_offsets[c+1]].
+Queries search rings of cells around the query's cell until no unsearched cell can hold a closer point.
+Works best for fairly uniform, dense data (e.g. urban POIs); cell size is derived from point density.
+Pts aren't kept as DataPoint objects: coords, zip codes and ids live in flat arrays and DataPoints are only
+materialized for the pts a query returns.
+Coordinates can be stored as float32 or int32 fixed-point to halve the coordinate array, i.e. ~31 -> ~23 bytes
+per pt overall w/ 5 char zips and int ids (see stats()['index_bytes']). Queries then run on the stored coords,
+so results are exact up to the storage resolution (1e-7 deg, ~1cm, for int32; ~1m for float32) and returned pts
+carry the stored coords. int32 is lossless for inputs w/ <= 7 decimals (e.g. all OSM data); an index only
+advertises EXACT if its stored coords round trip exactly.
+"""
+
+import numpy as np
+import heapq
+import os
+
+from data_importers import DataPoint, DataIngestionFactory, points_to_arrays, points_from_arrays
+from spatial_index import SpatialIndex, register_engine, as_query_vector, encode_coords, decode_coords, \
+                          EXACT, RANGE, PERSIST
+from config import SAMPLE_DATA
+
+
+@register_engine
+class GridIndex(SpatialIndex):
+    name = 'grid'
+    display_name = 'Grid Index'
+    capabilities = frozenset({EXACT, RANGE, PERSIST})
+    # points_per_cell sets the cell size from the pt density (exact results, only speed changes)
+    # precision is the coordinate storage type: 'float64', 'float32', or 'int32' (fixed-point)
+    default_params = {'points_per_cell': 4.0, 'precision': 'float64'}
+    tuning_params = {'points_per_cell': [1.0, 2.0, 4.0, 8.0, 16.0]}
+
+    def __init__(self, data_points: list[DataPoint], points_per_cell: float = 4.0, precision: str = 'float64'):
+        # points_per_cell is the avg num of pts we'd like in each (non-empty) cell...
+        # smaller cells -> fewer distance calcs but more cells to visit per ring.
+        self.points_per_cell = points_per_cell
+        self.precision = precision
+        self._build_grid(data_points)
+
+    @classmethod
+    def _build(cls, data_points, points_per_cell=4.0, precision='float64'):
+        return cls(data_points, points_per_cell=points_per_cell, precision=precision)
+
+    def _build_grid(self, data_points):
+        n = len(data_points)
+        original = np.array([p.as_vector() for p in data_points], dtype=np.float64).reshape(n, 2)
+        # everything (cells, pruning, distances) works off the stored coords so pruning is conservative for them
+        stored = encode_coords(original, self.precision)
+        coords = decode_coords(stored, self.precision)
+
+        if n:
+            mins, maxs = coords.min(axis=0), coords.max(axis=0)
+        else:
+            mins, maxs = np.zeros(2), np.zeros(2)
+        extent = np.maximum(maxs - mins, 1e-9)
+
+        # Adaptive cell size: square cells w/ (on avg) points_per_cell pts each
+        num_cells = max(1.0, n / self.points_per_cell)
+        cell_size = float(np.sqrt(extent[0] * extent[1] / num_cells))
+        cell_size = max(cell_size, float(extent.max()) / 4096)  # cap the grid dims for very skewed extents
+        self.cell_size = cell_size
+        self.origin = mins
+        self.nx, self.ny = (np.floor(extent / cell_size).astype(int) + 1).tolist()
+
+        # CSR layout: sort pts by cell id, offsets[c]..offsets[c+1] index the pts of cell c
+        cell_ids = self._cell_ids(coords)
+        order = np.argsort(cell_ids, kind='stable')
+        self.coords = stored[order]
+        self._store_points([data_points[i] for i in order])
+        # worst case coord error from storage rounding (0 for float64 and lossless int32)
+        self.coord_error = float(np.abs(coords - original).max()) if n else 0.0
+        if self.coord_error:
+            self.capabilities = self.capabilities - {EXACT}
+        counts = np.bincount(cell_ids, minlength=self.nx * self.ny)
+        self.cell_offsets = np.concatenate(([0], np.cumsum(counts)))
+
+    def _store_points(self, points):
+        # zip codes, ids and attributes as arrays (see points_to_arrays); coords are stored separately
+        _, self.zip_codes, self.point_ids, self.attributes = points_to_arrays(points)
+
+    def _points(self, idx) -> list[DataPoint]:
+        idx = np.asarray(idx, dtype=np.int64)
+        return points_from_arrays(decode_coords(self.coords[idx], self.precision), self.zip_codes[idx],
+                                  None if self.point_ids is None else self.point_ids[idx],
+                                  None if self.attributes is None else [self.attributes[i] for i in idx.tolist()])
+
+    def _cell_xy(self, coords):
+        cxy = np.floor((coords - self.origin) / self.cell_size).astype(int)
+        return np.clip(cxy[..., 0], 0, self.nx - 1), np.clip(cxy[..., 1], 0, self.ny - 1)
+
+    def _cell_ids(self, coords):
+        cx, cy = self._cell_xy(coords)
+        return cy * self.nx + cx
+
+    def _ring_indices(self, cx, cy, r):
+        # Point indices of all cells exactly r cells away (Chebyshev) from (cx, cy)...
+        x0, x1 = max(cx - r, 0), min(cx + r, self.nx - 1)
+        y0, y1 = max(cy - r, 0), min(cy + r, self.ny - 1)
+        spans = []
+        for y in range(y0, y1 + 1):
+            if y in (cy - r, cy + r):
+                # full row of the ring (cells in a row are contiguous in CSR order)
+                spans.append((y * self.nx + x0, y * self.nx + x1))
+            else:
+                for x in (cx - r, cx + r):
+                    if 0 <= x < self.nx:
+                        spans.append((y * self.nx + x, y * self.nx + x))
+        if not spans:
+            return None
+        return np.concatenate([np.arange(self.cell_offsets[a], self.cell_offsets[b + 1]) for a, b in spans])
+
+    def query(self, query_point, num_neighbors=5):
+        """k nearest neighbors via expanding-ring search (exact w.r.t. the stored coords)."""
+        q = np.array(as_query_vector(query_point), dtype=np.float64)
+        if not len(self.coords):
+            return []
+
+        cx, cy = self._cell_xy(q)
+        cx, cy = int(cx), int(cy)
+        max_ring = max(cx, self.nx - 1 - cx, cy, self.ny - 1 - cy)
+
+        heap = []  # max heap (negated dist) of the best k so far
+        for r in range(max_ring + 1):
+            idx = self._ring_indices(cx, cy, r)
+            if idx is not None and len(idx):
+                diffs = decode_coords(self.coords[idx], self.precision) - q
+                dists = np.sqrt(np.einsum('ij,ij->i', diffs, diffs))
+                if len(dists) > num_neighbors:
+                    keep = np.argpartition(dists, num_neighbors)[:num_neighbors]
+                    idx, dists = idx[keep], dists[keep]
+                for i, d in zip(idx.tolist(), dists.tolist()):
+                    if len(heap) < num_neighbors:
+                        heapq.heappush(heap, (-d, i))
+                    elif d < -heap[0][0]:
+                        heapq.heapreplace(heap, (-d, i))
+
+            if len(heap) == num_neighbors:
+                # Closest any pt outside the searched square of cells can be...
+                # (sides already past the grid's edge have no pts beyond them, which matters for queries outside it)
+                lo = self.origin + (np.array([cx, cy]) - r) * self.cell_size
+                hi = self.origin + (np.array([cx, cy]) + r + 1) * self.cell_size
+                bound = min(q[0] - lo[0] if cx - r > 0 else np.inf, hi[0] - q[0] if cx + r < self.nx - 1 else np.inf,
+                            q[1] - lo[1] if cy - r > 0 else np.inf, hi[1] - q[1] if cy + r < self.ny - 1 else np.inf)
+                if bound >= -heap[0][0]:
+                    break
+
+        return self._points([i for _, i in sorted(heap, key=lambda x: (-x[0], x[1]))])
+
+    def range_query(self, bbox):
+        if not len(self.coords):
+            return []
+        lo, hi = np.array(bbox[:2], dtype=np.float64), np.array(bbox[2:], dtype=np.float64)
+        x0, y0 = (int(v) for v in self._cell_xy(lo))
+        x1, y1 = (int(v) for v in self._cell_xy(hi))
+        hits = []
+        for y in range(y0, y1 + 1):
+            start, end = self.cell_offsets[y * self.nx + x0], self.cell_offsets[y * self.nx + x1 + 1]
+            coords = decode_coords(self.coords[start:end], self.precision)
+            hits.append(start + np.flatnonzero(np.all((coords >= lo) & (coords <= hi), axis=1)))
+        return self._points(np.concatenate(hits)) if hits else []
+
+    def _stats(self):
+        arrays = (self.coords, self.zip_codes, self.point_ids, self.cell_offsets)
+        return {'num_points': len(self.coords), 'cells': self.nx * self.ny,
+                'non_empty_cells': int(np.count_nonzero(np.diff(self.cell_offsets))), 'cell_size': self.cell_size,
+                'precision': self.precision, 'coord_error': self.coord_error, 'coord_bytes': self.coords.nbytes,
+                # everything but attribute dicts (only kept if the pts have any)
+                'index_bytes': sum(a.nbytes for a in arrays if a is not None)}
+
+
+if __name__ == '__main__':
+    file_path = os.path.join(SAMPLE_DATA)
+    data_points = DataIngestionFactory.load_data(file_path)
+
+    grid = GridIndex(data_points)
+
+    # Test
+    query_point = DataPoint(latitude=18.34, longitude=-64.92, zip_code=None)
+    results = grid.query(query_point)
+
+    print("Grid Index Nearest Neighbors:")
+    for result in results:
+        print(f"Zip Code: {result.zip_code}, Location: ({result.latitude}, {result.longitude})")
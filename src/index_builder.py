@@ -0,0 +1,146 @@
+"""
+Incremental, resumable index builds.
+Points are inserted in chunks of `checkpoint_every` pts and each chunk is appended to a journal next to the
+checkpoint, so a crash only loses the work since the last chunk and checkpoint I/O stays linear in the data
+(a full snapshot of the index is only written once a source is done, after which the journal is dropped).
+The same state makes refreshes incremental: re-running on a grown .csv only parses and inserts the rows past the
+recorded byte offset, and a new .osm.pbf extract only inserts nodes whose OSM ids aren't indexed yet.
+Only engines w/ the 'insert' capability (e.g. R-Tree, LSH) can be built this way.
+"""
+
+import os
+import pickle
+import logging as log
+import numpy as np
+
+from data_importers import DataIngestionFactory, CSV_EXTENSIONS, file_signature, points_to_arrays, points_from_arrays
+from spatial_index import SpatialIndex, UnsupportedOperation, get_engine, INSERT
+
+
+class CheckpointedIndexBuilder:
+    def __init__(self, checkpoint_path: str, engine: str = 'r_tree', checkpoint_every: int = 100_000, **params):
+        self.checkpoint_path = checkpoint_path
+        self.journal_path = checkpoint_path + '.journal'
+        self.engine = get_engine(engine)
+        if INSERT not in self.engine.capabilities:
+            raise UnsupportedOperation(f"{self.engine.display_name} can't be built incrementally (no insert support)")
+        self.checkpoint_every = checkpoint_every
+        self.params = params
+
+        self.index = None
+        # per source: size/mtime_ns when last seen, byte offset + rows at the end of the last complete pass (csv)
+        # and rows inserted so far; plus all OSM ids inserted (pbf) as a sorted array
+        self.state = {'engine': self.engine.name, 'sources': {}, 'osm_ids': np.zeros(0, dtype=np.int64)}
+        self.seq = 0  # num of the last journaled chunk
+        if os.path.exists(checkpoint_path):
+            self._load_checkpoint()
+        if os.path.exists(self.journal_path):
+            self._replay_journal()
+
+    def _load_checkpoint(self):
+        with open(self.checkpoint_path, 'rb') as f:
+            checkpoint = pickle.load(f)
+        if checkpoint['state']['engine'] != self.engine.name:
+            raise ValueError(f"Checkpoint {self.checkpoint_path} is for engine {checkpoint['state']['engine']}")
+        self.index, self.state, self.seq = checkpoint['index'], checkpoint['state'], checkpoint['seq']
+        log.info(f"Resuming from checkpoint {self.checkpoint_path} "
+                 f"({self.index.stats().get('num_points', '?')} pts indexed)")
+
+    def _replay_journal(self):
+        # re-insert the chunks journaled after the last snapshot; a torn last record (crash mid-write) is dropped
+        replayed, good_end = 0, 0
+        with open(self.journal_path, 'rb') as f:
+            while True:
+                try:
+                    record = pickle.load(f)
+                except (EOFError, pickle.UnpicklingError, ValueError):
+                    break
+                good_end = f.tell()
+                if record['seq'] <= self.seq:
+                    continue  # already in the snapshot
+                self._apply(record)
+                replayed += 1
+        if good_end < os.path.getsize(self.journal_path):
+            os.truncate(self.journal_path, good_end)
+        log.info(f"Replayed {replayed} journaled chunks from {self.journal_path}")
+
+    def _apply(self, record):
+        if self.index is None:
+            self.index = self.engine.build([], **self.params)
+        self.index.insert(points_from_arrays(*record['points']))
+        self.state['sources'][record['source']] = dict(record['progress'])
+        if record['is_pbf']:
+            self.state['osm_ids'] = np.union1d(self.state['osm_ids'], record['points'][2])
+        self.seq = record['seq']
+
+    def _journal(self, key, chunk, source, is_pbf):
+        # appends one chunk (as arrays) plus the source's progress after it
+        self.seq += 1
+        record = {'seq': self.seq, 'source': key, 'progress': dict(source), 'is_pbf': is_pbf,
+                  'points': points_to_arrays(chunk)}
+        with open(self.journal_path, 'ab') as f:
+            pickle.dump(record, f, protocol=pickle.HIGHEST_PROTOCOL)
+            f.flush()
+            os.fsync(f.fileno())
+
+    def checkpoint(self):
+        """Writes a full snapshot (index + state) and drops the journal it supersedes."""
+        # write then rename so a crash mid-write never corrupts the last good checkpoint
+        tmp_path = self.checkpoint_path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            pickle.dump({'index': self.index, 'state': self.state, 'seq': self.seq}, f,
+                        protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, self.checkpoint_path)
+        if os.path.exists(self.journal_path):
+            os.remove(self.journal_path)  # a crash before this is harmless, replay skips seqs <= self.seq
+
+    def add_source(self, file_path: str) -> SpatialIndex:
+        """Inserts whatever part of file_path isn't indexed yet (all of it if it's new) and returns the index."""
+        key = os.path.abspath(file_path)
+        size, mtime_ns = file_signature(file_path)
+        source = self.state['sources'].get(key)
+        if source and (source['size'], source['mtime_ns']) == (size, mtime_ns) and source['complete']:
+            log.info(f"{file_path} unchanged since last build, nothing to do")
+            return self.index
+        is_csv = file_path.endswith(CSV_EXTENSIONS)
+        if source and size < source['size'] and is_csv:
+            raise ValueError(f"{file_path} shrank since it was indexed; rows may have been removed, rebuild instead")
+
+        # offset / rows: where the last complete pass ended, done: rows inserted so far (more after a crash)
+        source = {'offset': 0, 'rows': 0, 'done': 0, **(source or {}),
+                  'size': size, 'mtime_ns': mtime_ns, 'complete': False}
+        end_offset = None
+        if file_path.endswith('.csv'):
+            # rows are only ever appended, so only the bytes past the last pass need parsing
+            columns, end_offset = DataIngestionFactory.read_csv_columns_from(file_path, source['offset'])
+            new_points = DataIngestionFactory.points_from_columns(columns, first_id=source['rows'])
+            new_points = new_points[source['done'] - source['rows']:]
+        elif is_csv:
+            # compressed, can't seek (the parsed columns are cached though, see load_csv_columns)
+            new_points = DataIngestionFactory.load_data(file_path)[source['done']:]
+        else:
+            # OSM node ids are stable across extracts (moved / retagged nodes w/ known ids are skipped)
+            data_points = DataIngestionFactory.load_data(file_path)
+            ids = np.array([p.point_id for p in data_points], dtype=np.int64)
+            new_points = [data_points[i] for i in np.flatnonzero(~np.isin(ids, self.state['osm_ids']))]
+        self.state['sources'][key] = source
+        log.info(f"{file_path}: {len(new_points)} new pts to index")
+
+        if self.index is None:
+            self.index = self.engine.build([], **self.params)
+
+        for start in range(0, len(new_points), self.checkpoint_every):
+            chunk = new_points[start:start + self.checkpoint_every]
+            self.index.insert(chunk)
+            source['done'] += len(chunk)
+            self._journal(key, chunk, source, is_pbf=not is_csv)
+            log.debug(f"Journaled {source['done']} pts of {file_path}")
+
+        if not is_csv and new_points:
+            self.state['osm_ids'] = np.union1d(self.state['osm_ids'], [p.point_id for p in new_points])
+        if end_offset is not None:
+            source['offset'] = end_offset
+        source['rows'] = source['done']
+        source['complete'] = True
+        self.checkpoint()
+        return self.index
@@ -6,6 +6,8 @@ https://docs.google.com/presentation/d/1cgaXUtRxTxCplw3CdPCHHPpMtw8CO0HeHZIf2TlU
 
 import numpy as np
 from data_importers import DataPoint, DataIngestionFactory
+from spatial_index import SpatialIndex, register_engine, as_query_vector, RANGE, FILTER, PERSIST
+from attribute_filters import matches, may_match, point_summary, merge_summaries
 import heapq
 import os
 import itertools
@@ -13,11 +15,23 @@ import itertools
 from config import SAMPLE_DATA, OSM_DATA
 
 
-class ApproximateKDTree:
+@register_engine
+class ApproximateKDTree(SpatialIndex):
+    name = 'kd_tree'
+    display_name = 'Approximate KD-Tree'
+    capabilities = frozenset({RANGE, FILTER, PERSIST})
+    default_params = {'max_depth': 10}  # nodes deeper than this are never visited by query()
+    tuning_params = {'max_depth': [8, 10, 12, 14, 16]}
+
     def __init__(self, data_points: list[DataPoint], max_depth: int = 10):
         self.max_depth = max_depth
+        self.num_points = len(data_points)
         self.tree = self._build_tree(data_points)
 
+    @classmethod
+    def _build(cls, data_points, max_depth=10):
+        return cls(data_points, max_depth=max_depth)
+
     def _build_tree(self, points, depth=0):
         if not points:
             return None
@@ -26,17 +40,31 @@ class ApproximateKDTree:
         points.sort(key=lambda point: point.as_vector()[axis])
         median = len(points) // 2
 
+        left = self._build_tree(points[:median], depth + 1)
+        right = self._build_tree(points[median + 1:], depth + 1)
+        point = points[median]
+
+        # attribute summary of the whole subtree so filtered queries can skip it (see attribute_filters.py)
+        summaries = [s for s in (point_summary(point) if point.attributes else None,
+                                 left and left['summary'], right and right['summary']) if s]
         return {
-            'point': points[median],
-            'left': self._build_tree(points[:median], depth + 1),
-            'right': self._build_tree(points[median + 1:], depth + 1)
+            'point': point,
+            'left': left,
+            'right': right,
+            'summary': merge_summaries(summaries) if summaries else {},
         }
 
     def _distance(self, p1: DataPoint, p2: DataPoint):
         return np.linalg.norm(np.array(p1.as_vector()) - np.array(p2.as_vector()))
 
-    def query(self, query_point, num_neighbors=5):
-        """Query the KD-Tree using priority search for the k nearest neighbors."""
+    def query(self, query_point, num_neighbors=5, predicates=None):
+        """
+        Query the KD-Tree using priority search for the k nearest neighbors.
+        predicates: optional attribute filters (see attribute_filters.py); non matching subtrees are skipped.
+        """
+        if not isinstance(query_point, DataPoint):
+            lon, lat = as_query_vector(query_point)
+            query_point = DataPoint(latitude=lat, longitude=lon, zip_code=None)
         heap = []                      # Max heap for k 'nearest neighbors'
         priority_queue = []            # Min heap for priority-based traversal...
         unique_id = itertools.count()  # Unique identifier for each node
@@ -49,13 +77,16 @@ class ApproximateKDTree:
 
             if node is None or depth > self.max_depth:
                 continue
+            if predicates and not may_match(node['summary'], predicates):
+                continue
 
             # Calc dist to curr node
-            dist = self._distance(query_point, node['point'])
-            if len(heap) < num_neighbors:
-                heapq.heappush(heap, (-dist, node['point']))
-            elif dist < -heap[0][0]:
-                heapq.heapreplace(heap, (-dist, node['point']))
+            if not predicates or matches(node['point'], predicates):
+                dist = self._distance(query_point, node['point'])
+                if len(heap) < num_neighbors:
+                    heapq.heappush(heap, (-dist, next(unique_id), node['point']))
+                elif dist < -heap[0][0]:
+                    heapq.heapreplace(heap, (-dist, next(unique_id), node['point']))
 
             # Determine split axis (i.e. where rect split to form next smaller rect...)
             axis = depth % 2
@@ -65,11 +96,38 @@ class ApproximateKDTree:
             nearer = node['left'] if diff < 0 else node['right']
             farther = node['right'] if diff < 0 else node['left']
             heapq.heappush(priority_queue, (0, next(unique_id), nearer, depth + 1))
-            if abs(diff) < -heap[0][0] or len(heap) < num_neighbors:
+            if len(heap) < num_neighbors or abs(diff) < -heap[0][0]:
                 heapq.heappush(priority_queue, (abs(diff), next(unique_id), farther, depth + 1))
 
         # Extract results sorted by dist...
-        return [item[1] for item in sorted(heap, key=lambda x: -x[0])]
+        return [item[2] for item in sorted(heap, key=lambda x: -x[0])]
+
+    def range_query(self, bbox, predicates=None):
+        """All pts in bbox (exact, i.e. ignores max_depth)."""
+        lo, hi = (bbox[0], bbox[1]), (bbox[2], bbox[3])
+        results = []
+        stack = [(self.tree, 0)]
+        while stack:
+            node, depth = stack.pop()
+            if node is None or (predicates and not may_match(node['summary'], predicates)):
+                continue
+            vector = node['point'].as_vector()
+            if lo[0] <= vector[0] <= hi[0] and lo[1] <= vector[1] <= hi[1]:
+                if not predicates or matches(node['point'], predicates):
+                    results.append(node['point'])
+            axis = depth % 2
+            if lo[axis] <= vector[axis]:
+                stack.append((node['left'], depth + 1))
+            if vector[axis] <= hi[axis]:
+                stack.append((node['right'], depth + 1))
+        return results
+
+    def _stats(self):
+        depth, level = 0, [self.tree] if self.tree else []
+        while level:
+            depth += 1
+            level = [ch for node in level for ch in (node['left'], node['right']) if ch is not None]
+        return {'num_points': self.num_points, 'depth': depth}
 
 
 if __name__ == '__main__':
@@ -8,12 +8,20 @@ import numpy as np
 from sklearn.random_projection import GaussianRandomProjection  # only skleran package I'm currently using...
 from collections import defaultdict
 from data_importers import DataPoint, DataIngestionFactory
+from spatial_index import SpatialIndex, register_engine, as_query_vector, INSERT, PERSIST
 import os
 
 from config import SAMPLE_DATA
 
 
-class MultiTableLSH:
+@register_engine
+class MultiTableLSH(SpatialIndex):
+    name = 'lsh'
+    display_name = 'Multi-Table LSH'
+    capabilities = frozenset({INSERT, PERSIST})
+    default_params = {'num_tables': 3, 'hash_size': 2}
+    tuning_params = {'num_tables': [3, 6, 10], 'hash_size': [1, 2]}
+
     def __init__(self, num_tables: int, hash_size: int):
         self.num_tables = num_tables
         self.hash_size = hash_size  # each hash table maps a hash key to a set of pts...
@@ -21,6 +29,12 @@ class MultiTableLSH:
         # the projection reduces dimensionality...
         self.projections = [GaussianRandomProjection(n_components=hash_size) for _ in range(num_tables)]
 
+    @classmethod
+    def _build(cls, data_points, num_tables=3, hash_size=2):
+        lsh = cls(num_tables=num_tables, hash_size=hash_size)
+        lsh.insert(data_points)
+        return lsh
+
     def _hash(self, vector, table_index):
         # project to lower dims and hash
         # KEY concept: pts close in original space tend to produce similar hash keys here...
@@ -37,7 +51,7 @@ class MultiTableLSH:
     def query(self, query_point: DataPoint, num_neighbors: int = 10):
         # query pt by computing hash keys to retrieve candidates...
         candidate_set = set()
-        query_vector = query_point.as_vector()
+        query_vector = as_query_vector(query_point)
 
         for i in range(self.num_tables):
             hash_key = self._hash(query_vector, i)
@@ -51,6 +65,12 @@ class MultiTableLSH:
 
         return neighbors[:num_neighbors]
 
+    def _stats(self):
+        return {
+            'num_points': sum(len(b) for b in self.hash_tables[0].values()) if self.hash_tables else 0,
+            'buckets_per_table': [len(table) for table in self.hash_tables],
+        }
+
 
 if __name__ == '__main__':
 
@@ -22,6 +22,7 @@ def main():
     root = tk.Tk()
     app = InteractiveApp(root)
     root.mainloop()
+    app.close()
 
     print('\nProgram complete.')
 
@@ -5,40 +5,85 @@ https://docs.google.com/presentation/d/1cgaXUtRxTxCplw3CdPCHHPpMtw8CO0HeHZIf2TlU
 """
 
 from data_importers import DataPoint, DataIngestionFactory
+from spatial_index import SpatialIndex, register_engine, EXACT, RANGE, INSERT, FILTER, PERSIST
+from attribute_filters import matches, may_match, point_summary, merge_summaries, merge_into
 import os
 
 
+def _entry_mbr(entry):
+    # leaves hold DataPoints directly (a pt's mbr is just itself), internal nodes {'node': child, 'mbr': [...]}
+    if isinstance(entry, DataPoint):
+        return entry.longitude, entry.latitude, entry.longitude, entry.latitude
+    return entry['mbr']
+
+
 class RTreeNode:
     def __init__(self, is_leaf=True, parent=None):
         self.is_leaf = is_leaf
         self.children = []
         self.mbr = None  # 'minimum boudning rectangle' (easy to see in image in slides...)
+        self.summary = {}  # attribute min/max or value sets of everything below (see attribute_filters.py)
         self.parent = parent
 
     def compute_mbr(self):
         if not self.children:
             self.mbr = None
             return
+        if self.is_leaf:
+            lons, lats = [p.longitude for p in self.children], [p.latitude for p in self.children]
+            self.mbr = [min(lons), min(lats), max(lons), max(lats)]
+            return
         xmins, ymins, xmaxs, ymaxs = zip(*(child['mbr'] for child in self.children))
         self.mbr = [min(xmins), min(ymins), max(xmaxs), max(ymaxs)]
 
+    def compute_summary(self):
+        if self.is_leaf:
+            self.summary = merge_summaries(point_summary(p) for p in self.children if p.attributes)
+        else:
+            self.summary = merge_summaries(ch['node'].summary for ch in self.children if ch['node'].summary)
+
+
 
+@register_engine
+class RTree(SpatialIndex):
+    name = 'r_tree'
+    display_name = 'R-Tree'
+    capabilities = frozenset({EXACT, RANGE, INSERT, FILTER, PERSIST})
+    # max_children is the max num of children the node can hold before needing to split...
+    # (results are exact now that parent mbrs are kept up to date, so this only trades build vs query time;
+    #  small values, e.g. 8, give deeper trees that build and query faster on the sample data)
+    default_params = {'max_children': 64}
+    tuning_params = {'max_children': [8, 16, 32, 64, 128]}
 
-class RTree:
     def __init__(self, max_children=32):
         self.root = RTreeNode()
         self.max_children = max_children  # how many entries a node can hold before splitting...
-        #  higher max_children will run longer but produce more accurate resuults..
+        self.num_points = 0
+        self.has_attributes = False  # attribute summaries are only maintained once a pt w/ attributes shows up
+
+    @classmethod
+    def _build(cls, data_points, max_children=64):
+        r_tree = cls(max_children=max_children)
+        r_tree.insert(data_points)
+        return r_tree
 
     def insert(self, points):
         # insert pts indiviually...
         for point in points:
             mbr = [point.longitude, point.latitude, point.longitude, point.latitude]
             leaf = self._choose_leaf(self.root, mbr)
-            # At leaves, store actual points rather than child nodes...
-            leaf.children.append({'point': point, 'mbr': mbr})
-            leaf.compute_mbr()
+            # At leaves, store actual points rather than child nodes (no per pt mbr, see _entry_mbr)...
+            leaf.children.append(point)
+            if point.attributes:
+                # just merge the new pt into the summaries on its path (only split nodes get recomputed)
+                self.has_attributes = True
+                summary, node = point_summary(point), leaf
+                while node is not None:
+                    merge_into(node.summary, summary)
+                    node = node.parent
+            self._refresh(leaf)
             self._handle_overflow(leaf)
+            self.num_points += 1
 
     def _handle_overflow(self, node):
         # if node has too many children, split it...
@@ -55,7 +100,7 @@ class RTree:
                     {'node': left_node, 'mbr': left_node.mbr},
                     {'node': right_node, 'mbr': right_node.mbr}
                 ]
-                new_root.compute_mbr()
+                self._refresh(new_root, summary=True)
                 return
             else:
                 # adjust parent by removing old node & adding 2 new nodes...
@@ -70,8 +115,26 @@ class RTree:
 
                 parent.children.append({'node': left_node, 'mbr': left_node.mbr})
                 parent.children.append({'node': right_node, 'mbr': right_node.mbr})
-                parent.compute_mbr()
+                self._refresh(parent)
                 node = parent
+        self._adjust_tree(node)
+
+    def _refresh(self, node, summary=False):
+        # summaries are kept up to date incrementally by insert(), only new nodes (splits / root) need one computed
+        node.compute_mbr()
+        if summary and self.has_attributes:
+            node.compute_summary()
+
+    def _adjust_tree(self, node):
+        # propagate a changed mbr up to the root (parent entries keep their own copy of the child's mbr)
+        while node.parent is not None:
+            parent = node.parent
+            for ch in parent.children:
+                if ch.get('node') is node:
+                    ch['mbr'] = node.mbr
+                    break
+            self._refresh(parent)
+            node = parent
 
     def _split_node(self, node):
         children = node.children
@@ -94,11 +157,11 @@ class RTree:
 
         left_node = RTreeNode(is_leaf=is_leaf, parent=node.parent)
         left_node.children = left_children
-        left_node.compute_mbr()
+        self._refresh(left_node, summary=True)
 
         right_node = RTreeNode(is_leaf=is_leaf, parent=node.parent)
         right_node.children = right_children
-        right_node.compute_mbr()
+        self._refresh(right_node, summary=True)
 
         # Set parent for child nodes...if they are internal nodes
         if not is_leaf:
@@ -115,7 +178,7 @@ class RTree:
         seed1, seed2 = 0, 1
         for i in range(len(children)):
             for j in range(i+1, len(children)):
-                dist = self._mbr_distance(children[i]['mbr'], children[j]['mbr'])
+                dist = self._mbr_distance(_entry_mbr(children[i]), _entry_mbr(children[j]))
                 if dist > max_dist:
                     max_dist = dist
                     seed1, seed2 = i, j
@@ -131,9 +194,9 @@ class RTree:
 
     def _expansion(self, group, candidate):
         # Compute the area expansion if candidate is added to group
-        mbrs = [c['mbr'] for c in group] + [candidate['mbr']]
-        combined = self._combine_mbrs(mbrs)
-        return self._area(combined) - self._area(self._combine_mbrs([c['mbr'] for c in group]))
+        mbrs = [_entry_mbr(c) for c in group]
+        combined = self._combine_mbrs(mbrs + [_entry_mbr(candidate)])
+        return self._area(combined) - self._area(self._combine_mbrs(mbrs))
 
     def _combine_mbrs(self, mbrs):
         xmins, ymins, xmaxs, ymaxs = zip(*mbrs)
@@ -157,7 +220,8 @@ class RTree:
         current_area = (parent_mbr[2] - parent_mbr[0]) * (parent_mbr[3] - parent_mbr[1])
         return new_area - current_area
 
-    def query(self, query_point, num_neighbors=1):
+    def query(self, query_point, num_neighbors=1, predicates=None):
+        """predicates: optional attribute filters (see attribute_filters.py); non matching subtrees are skipped."""
         import heapq
         candidate_nodes = []
         # Include an id() call on self.root...ensures uniqueness...
@@ -169,20 +233,53 @@ class RTree:
             distance, _, node = heapq.heappop(candidate_nodes)
 
             if node.is_leaf:
-                for child in node.children:
-                    dist = self._distance(query_point, child['mbr'])
+                for point in node.children:
+                    if predicates and not matches(point, predicates):
+                        continue
+                    dist = self._distance(query_point, _entry_mbr(point))
                     if len(nearest_neighbors) < num_neighbors:
-                        heapq.heappush(nearest_neighbors, (-dist, child['point']))
+                        heapq.heappush(nearest_neighbors, (-dist, id(point), point))
                     elif dist < -nearest_neighbors[0][0]:
-                        heapq.heapreplace(nearest_neighbors, (-dist, child['point']))
+                        heapq.heapreplace(nearest_neighbors, (-dist, id(point), point))
             else:
                 for child in node.children:
+                    if predicates and not may_match(child['node'].summary, predicates):
+                        continue
                     child_dist = self._distance(query_point, child['mbr'])
                     if len(nearest_neighbors) < num_neighbors or child_dist < -nearest_neighbors[0][0]:
                         heapq.heappush(candidate_nodes, (child_dist, id(child['node']), child['node']))
 
         sorted_neighbors = sorted(nearest_neighbors, key=lambda x: -x[0])
-        return [item[1] for item in sorted_neighbors]
+        return [item[2] for item in sorted_neighbors]
+
+    def range_query(self, bbox, predicates=None):
+        results = []
+        stack = [self.root]
+        while stack:
+            node = stack.pop()
+            for child in node.children:
+                if not self._intersects(_entry_mbr(child), bbox):
+                    continue
+                if node.is_leaf:
+                    if not predicates or matches(child, predicates):
+                        results.append(child)
+                elif not predicates or may_match(child['node'].summary, predicates):
+                    stack.append(child['node'])
+        return results
+
+    def _intersects(self, mbr, bbox):
+        return mbr[0] <= bbox[2] and bbox[0] <= mbr[2] and mbr[1] <= bbox[3] and bbox[1] <= mbr[3]
+
+    def _stats(self):
+        height, num_nodes = 1, 0
+        level = [self.root]
+        while level:
+            num_nodes += len(level)
+            if level[0].is_leaf:
+                break
+            level = [ch['node'] for node in level for ch in node.children]
+            height += 1
+        return {'num_points': self.num_points, 'height': height, 'num_nodes': num_nodes}
 
     def _distance(self, query_point, mbr):
         if isinstance(query_point, DataPoint):
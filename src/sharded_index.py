@@ -0,0 +1,240 @@
+"""
+Implementation of a sharded (partitioned) index for datasets too big for a single index / core.
+Points are split into spatially compact shards (contiguous ranges of the Hilbert curve) and each shard is built
+w/ any registered engine. With workers > 1 the shards live in long-lived worker processes (only coordinate / zip /
+id arrays are sent over, both at build and in query results; close() or garbage collection stops them), otherwise
+they're built and queried in-process.
+Queries first ask the shard closest to the query pt, then ask all other shards whose bounding box could still hold
+one of the k nearest neighbors at once (in parallel across workers), merging the per-shard top k.
+"""
+
+import os
+import heapq
+import weakref
+import logging as log
+import multiprocessing as mp
+import numpy as np
+
+from data_importers import DataPoint, DataIngestionFactory, hilbert_keys, points_to_arrays, points_from_arrays
+from spatial_index import SpatialIndex, UnsupportedOperation, register_engine, get_engine, as_query_vector, \
+                          EXACT, RANGE
+from config import SAMPLE_DATA
+
+
+def _run(shard: SpatialIndex, cmd: str, args: tuple):
+    if cmd == 'query':
+        return shard.query(*args)
+    if cmd == 'range':
+        return shard.range_query(*args)
+    if cmd == 'stats':
+        return shard.stats()
+    raise ValueError(f"Unknown shard command: {cmd}")
+
+
+def _serve_shards(conn, engine_name: str, chunks: dict, params: dict):
+    # Worker process main loop: build this worker's shards once, then answer (cmd, shard_ids, args) until 'close'
+    try:
+        shards = {s: get_engine(engine_name).build(points_from_arrays(*chunk), **params) for s, chunk in chunks.items()}
+    except Exception as e:
+        conn.send((False, e))
+        return
+    conn.send((True, None))
+    while (msg := conn.recv()) != 'close':
+        cmd, shard_ids, args = msg
+        try:
+            results = [_run(shards[s], cmd, args) for s in shard_ids]
+            conn.send((True, results if cmd == 'stats' else [points_to_arrays(r) for r in results]))
+        except Exception as e:
+            conn.send((False, e))
+    conn.close()
+
+
+class _LocalShards:
+    """Shards built and queried in this process (same submit / result protocol as _WorkerShards)."""
+
+    def __init__(self, engine_name, chunks, params):
+        self.shards = {s: get_engine(engine_name).build(points_from_arrays(*chunk), **params) for s, chunk in chunks.items()}
+        self._results = None
+
+    def submit(self, cmd, shard_ids, *args):
+        self._results = [_run(self.shards[s], cmd, args) for s in shard_ids]
+
+    def result(self):
+        return self._results
+
+    def close(self):
+        self.shards = {}
+
+
+class _WorkerShards:
+    """Shards living in a worker process; submit() returns right away so several workers can run at once."""
+
+    def __init__(self, engine_name, chunks, params):
+        self.conn, child_conn = mp.Pipe()
+        self.process = mp.Process(target=_serve_shards, args=(child_conn, engine_name, chunks, params),
+                                  name='shard-worker', daemon=True)
+        self.process.start()
+        child_conn.close()
+        self._cmd = None
+
+    def submit(self, cmd, shard_ids, *args):
+        self.conn.send((cmd, shard_ids, args))
+        self._cmd = cmd
+
+    def result(self):
+        ok, payload = self.conn.recv()
+        if not ok:
+            raise payload
+        if payload is None or self._cmd == 'stats':
+            return payload
+        return [points_from_arrays(*arrays) for arrays in payload]
+
+    def close(self):
+        if self.process.is_alive():
+            try:
+                self.conn.send('close')
+            except OSError:
+                pass
+            self.process.join(timeout=5)
+        self.conn.close()
+
+
+def _close_hosts(hosts: list):
+    # not a method so the finalizer doesn't keep the index alive
+    for host in hosts:
+        host.close()
+    hosts.clear()
+
+
+@register_engine
+class ShardedIndex(SpatialIndex):
+    name = 'sharded'
+    display_name = 'Sharded Index'
+    # w/ the default (grid) base engine; each instance narrows this to what its base engine supports
+    # (no PERSIST: the shards may live in other processes)
+    capabilities = frozenset({EXACT, RANGE})
+    # workers: num of worker processes holding the shards (None = one per shard, up to the num of cores;
+    # <= 1 keeps everything in this process, the default so that building one never forks on its own)
+    default_params = {'base_engine': 'grid', 'num_shards': 4, 'workers': 1, 'base_params': None}
+    tuning_params = {'num_shards': [2, 4, 8]}
+
+    def __init__(self, hosts: list, host_of: list[int], bounds: np.ndarray, base_engine: str):
+        self.hosts = hosts        # _LocalShards / _WorkerShards, each holding some of the shards
+        self.host_of = host_of    # shard -> index into hosts
+        self.bounds = bounds      # (num_shards, 4) rows of [min_lon, min_lat, max_lon, max_lat]
+        self.num_shards = len(bounds)
+        self.base_engine = base_engine
+        self.capabilities = get_engine(base_engine).capabilities & ShardedIndex.capabilities
+        self._finalizer = weakref.finalize(self, _close_hosts, hosts)
+
+    @classmethod
+    def _build(cls, data_points, base_engine='grid', num_shards=4, workers=1, base_params=None):
+        coords, zip_codes, point_ids, attributes = points_to_arrays(data_points)
+        order = np.argsort(hilbert_keys(coords), kind='stable') if len(coords) else np.zeros(0, dtype=np.int64)
+        splits = [s for s in np.array_split(order, num_shards) if len(s)]
+        chunks = [(coords[s], zip_codes[s], None if point_ids is None else point_ids[s],
+                   None if attributes is None else [attributes[i] for i in s]) for s in splits]
+        bounds = np.array([[*c[0].min(axis=0), *c[0].max(axis=0)] for c in chunks], dtype=np.float64).reshape(-1, 4)
+
+        workers = min(len(chunks), os.cpu_count() or 1) if workers is None else min(workers, len(chunks))
+        if workers > 1:
+            host_of = [s % workers for s in range(len(chunks))]
+            hosts = [_WorkerShards(base_engine, {s: chunks[s] for s in range(len(chunks)) if host_of[s] == w},
+                                   base_params or {}) for w in range(workers)]
+            try:
+                for host in hosts:
+                    host.result()  # wait until every worker has built its shards
+            except Exception:
+                for host in hosts:
+                    host.close()
+                raise
+        else:
+            host_of = [0] * len(chunks)
+            hosts = [_LocalShards(base_engine, dict(enumerate(chunks)), base_params or {})]
+        return cls(hosts, host_of, bounds, base_engine)
+
+    def _ask(self, cmd, shard_ids, *args) -> list:
+        # one request per host involved, then collect the replies (so the hosts work concurrently in between)
+        by_host = {}
+        for s in shard_ids:
+            by_host.setdefault(self.host_of[s], []).append(s)
+        for h, ids in by_host.items():
+            self.hosts[h].submit(cmd, ids, *args)
+        # read every reply even if one fails, else the rest would be picked up as replies to the next request
+        results, error = [], None
+        for h in by_host:
+            try:
+                results.extend(self.hosts[h].result())
+            except Exception as e:
+                error = error or e
+        if error is not None:
+            raise error
+        return results
+
+    def _min_dists(self, q):
+        # squared dist from q to each shard's bounding box (0 if inside)
+        d = np.maximum(0, np.maximum(self.bounds[:, :2] - q, q - self.bounds[:, 2:]))
+        return np.einsum('ij,ij->i', d, d)
+
+    def _query(self, query_point, num_neighbors=5) -> tuple[list[DataPoint], int]:
+        """k nearest neighbors plus the num of shards visited."""
+        q = np.array(as_query_vector(query_point), dtype=np.float64)
+        if not self.num_shards:
+            return [], 0
+        min_dists = self._min_dists(q)
+        order = np.argsort(min_dists, kind='stable')
+
+        heap = []  # max heap (negated squared dist) of the best k across shards
+
+        def merge(results):
+            for points in results:
+                for point in points:
+                    diff = np.array(point.as_vector()) - q
+                    d = float(diff @ diff)
+                    if len(heap) < num_neighbors:
+                        heapq.heappush(heap, (-d, id(point), point))
+                    elif d < -heap[0][0]:
+                        heapq.heapreplace(heap, (-d, id(point), point))
+
+        # closest shard first for a k-th dist bound, then all shards that could still beat it in one round
+        merge(self._ask('query', [int(order[0])], q.tolist(), num_neighbors))
+        rest = [int(s) for s in order[1:] if len(heap) < num_neighbors or min_dists[s] < -heap[0][0]]
+        merge(self._ask('query', rest, q.tolist(), num_neighbors))
+
+        return [item[2] for item in sorted(heap, key=lambda x: -x[0])], 1 + len(rest)
+
+    def query(self, query_point, num_neighbors=5):
+        results, visited = self._query(query_point, num_neighbors)
+        log.debug("Sharded query visited %d of %d shards", visited, self.num_shards)
+        return results
+
+    def range_query(self, bbox):
+        if not self.supports(RANGE):
+            raise UnsupportedOperation(f"{self.display_name} over {self.base_engine} does not support range queries")
+        b = self.bounds
+        hits = np.flatnonzero((b[:, 0] <= bbox[2]) & (bbox[0] <= b[:, 2]) &
+                              (b[:, 1] <= bbox[3]) & (bbox[1] <= b[:, 3]))
+        return [p for points in self._ask('range', hits.tolist(), bbox) for p in points]
+
+    def close(self):
+        """Stops the worker processes (if any); the index can't be queried afterwards."""
+        self._finalizer()
+
+    def _stats(self):
+        shard_stats = self._ask('stats', range(self.num_shards))
+        return {'num_points': sum(s.get('num_points', 0) for s in shard_stats),
+                'num_shards': self.num_shards, 'workers': len(self.hosts), 'base_engine': self.base_engine}
+
+
+if __name__ == '__main__':
+    file_path = os.path.join(SAMPLE_DATA)
+    data_points = DataIngestionFactory.load_data(file_path)
+
+    with ShardedIndex.build(data_points, num_shards=8) as sharded:
+        # Test
+        query_point = DataPoint(latitude=18.34, longitude=-64.92, zip_code=None)
+        results, visited = sharded._query(query_point)
+
+        print(f"Sharded Index Nearest Neighbors ({visited} of {sharded.num_shards} shards visited):")
+        for result in results:
+            print(f"Zip Code: {result.zip_code}, Location: ({result.latitude}, {result.longitude})")
@@ -0,0 +1,159 @@
+"""
+Common interface for all the search engines (R-Tree, KD-Tree, LSH, Grid, ...) plus a registry of them.
+The benchmark and the app only talk to engines through this, so a new engine just needs to subclass SpatialIndex
+and be decorated with @register_engine (and its module listed in ENGINE_MODULES).
+"""
+
+import time
+import pickle
+import importlib
+import numpy as np
+from abc import ABC, abstractmethod
+
+from data_importers import DataPoint
+
+# Modules imported by available_engines() so their engines register themselves...
+ENGINE_MODULES = ['kd_tree', 'lsh', 'r_tree', 'grid_index', 'sharded_index']
+
+# Capabilities an engine can advertise...
+EXACT   = 'exact'    # k-NN results are exact (not approximate)
+RANGE   = 'range'    # supports range_query
+INSERT  = 'insert'   # supports adding pts after build
+FILTER  = 'filter'   # query / range_query take attribute `predicates` (see attribute_filters.py)
+PERSIST = 'persist'  # can be pickled w/ save() / load()
+
+# Coordinate storage precisions for array backed engines...
+# 'int32' is fixed-point w/ 1e-7 degree resolution (what OSM itself uses), i.e. ~1cm
+PRECISIONS = ('float64', 'float32', 'int32')
+FIXED_POINT_SCALE = 1e7
+
+_registry: dict[str, type['SpatialIndex']] = {}
+
+
+class UnsupportedOperation(ValueError):
+    """Raised when an index is asked for something it doesn't advertise in its capabilities."""
+
+
+def as_query_vector(query_point) -> list[float]:
+    """Accepts a DataPoint or a raw [lon, lat] and returns [lon, lat]."""
+    if isinstance(query_point, DataPoint):
+        return query_point.as_vector()
+    return [float(query_point[0]), float(query_point[1])]
+
+
+def encode_coords(coords: np.ndarray, precision: str = 'float64') -> np.ndarray:
+    """Stores float64 [lon, lat] rows at the given precision (see PRECISIONS)."""
+    if precision == 'float64':
+        return np.ascontiguousarray(coords, dtype=np.float64)
+    if precision == 'float32':
+        return np.ascontiguousarray(coords, dtype=np.float32)
+    if precision == 'int32':
+        return np.round(np.asarray(coords) * FIXED_POINT_SCALE).astype(np.int32)
+    raise ValueError(f"Unsupported precision: {precision} (expected one of {PRECISIONS})")
+
+
+def decode_coords(stored: np.ndarray, precision: str = 'float64') -> np.ndarray:
+    """Inverse of encode_coords (as float64, w/ the storage rounding error)."""
+    if precision == 'int32':
+        return stored.astype(np.float64) / FIXED_POINT_SCALE
+    return stored.astype(np.float64, copy=False)
+
+
+class SpatialIndex(ABC):
+    name: str = ''               # registry key, e.g. 'r_tree'
+    display_name: str = ''       # shown in logs / the app
+    capabilities: frozenset = frozenset()
+    default_params: dict = {}    # params used by build() when not given
+    tuning_params: dict = {}     # candidate values per param for the auto tuner (see auto_tuner.py)
+
+    @classmethod
+    def build(cls, data_points: list[DataPoint], **params) -> 'SpatialIndex':
+        """Builds an index over data_points; unspecified params fall back to default_params."""
+        params = {**cls.default_params, **params}
+        start_time = time.time()
+        index = cls._build(list(data_points), **params)
+        index.params = params
+        index.build_time = time.time() - start_time
+        return index
+
+    @classmethod
+    @abstractmethod
+    def _build(cls, data_points: list[DataPoint], **params) -> 'SpatialIndex':
+        ...
+
+    @abstractmethod
+    def query(self, query_point, num_neighbors: int = 5) -> list[DataPoint]:
+        """k nearest neighbors of a DataPoint or [lon, lat], closest first."""
+
+    def batch_query(self, query_points, num_neighbors: int = 5) -> list[list[DataPoint]]:
+        return [self.query(q, num_neighbors) for q in query_points]
+
+    def range_query(self, bbox: tuple[float, float, float, float]) -> list[DataPoint]:
+        """All pts inside bbox = (min_lon, min_lat, max_lon, max_lat)."""
+        raise UnsupportedOperation(f"{self.display_name} does not support range queries")
+
+    def insert(self, data_points: list[DataPoint]):
+        raise UnsupportedOperation(f"{self.display_name} does not support inserts after build")
+
+    def save(self, path: str):
+        if not self.supports(PERSIST):
+            raise UnsupportedOperation(f"{self.display_name} can't be saved")
+        with open(path, 'wb') as f:
+            pickle.dump(self, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    @classmethod
+    def load(cls, path: str) -> 'SpatialIndex':
+        with open(path, 'rb') as f:
+            index = pickle.load(f)
+        if not isinstance(index, cls):
+            raise TypeError(f"{path} holds a {type(index).__name__}, not a {cls.__name__}")
+        return index
+
+    def stats(self) -> dict:
+        return {
+            'engine': self.name,
+            'params': getattr(self, 'params', {}),
+            'build_time': getattr(self, 'build_time', None),
+            **self._stats(),
+        }
+
+    def _stats(self) -> dict:
+        # engine specific numbers (num_points, depth, ...)
+        return {}
+
+    def supports(self, capability: str) -> bool:
+        # per instance, since e.g. a wrapper's capabilities can depend on what it was built with
+        return capability in self.capabilities
+
+    def close(self):
+        """Releases whatever the index holds outside this process (worker processes, ...); no-op by default."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def register_engine(cls: type[SpatialIndex]) -> type[SpatialIndex]:
+    """Class decorator adding an engine to the registry under cls.name."""
+    if not cls.name:
+        raise ValueError(f"{cls.__name__} needs a name to be registered")
+    _registry[cls.name] = cls
+    return cls
+
+
+def available_engines(capability: str = None) -> list[str]:
+    """Names of all registered engines (optionally only those w/ the given capability)."""
+    for module in ENGINE_MODULES:
+        importlib.import_module(module)
+    return [name for name, cls in _registry.items() if capability is None or capability in cls.capabilities]
+
+
+def get_engine(name: str) -> type[SpatialIndex]:
+    if name not in _registry:
+        available_engines()
+    try:
+        return _registry[name]
+    except KeyError:
+        raise ValueError(f"Unknown engine: {name} (available: {', '.join(_registry)})") from None
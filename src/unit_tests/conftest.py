@@ -0,0 +1,47 @@
+"""
+Fixtures shared by the engine tests: random pts and brute force reference answers.
+"""
+
+import pytest
+import numpy as np
+from data_importers import DataPoint
+
+
+@pytest.fixture(scope='session')
+def make_points():
+    """make_points(n, lon_range, lat_range, seed) -> n uniformly random pts w/ zip_code = str(i)."""
+    def make_points(n, lon_range=(-72, -70), lat_range=(41, 43), seed=0):
+        rng = np.random.default_rng(seed)
+        return [DataPoint(latitude=lat, longitude=lon, zip_code=str(i))
+                for i, (lon, lat) in enumerate(zip(rng.uniform(*lon_range, n), rng.uniform(*lat_range, n)))]
+    return make_points
+
+@pytest.fixture(scope='module')
+def data_points(make_points):
+    return make_points(500)
+
+@pytest.fixture(scope='session')
+def brute_force():
+    """brute_force(data_points, query_point, k, predicates=None) -> exact k nearest (ties in input order)."""
+    from attribute_filters import matches
+
+    def brute_force(data_points, query_point, k, predicates=None):
+        if predicates:
+            data_points = [p for p in data_points if matches(p, predicates)]
+        if not data_points:
+            return []
+        q = np.array(query_point.as_vector() if isinstance(query_point, DataPoint) else query_point, dtype=float)
+        diffs = np.array([p.as_vector() for p in data_points]) - q
+        order = np.argsort(np.einsum('ij,ij->i', diffs, diffs), kind='stable')[:k]
+        return [data_points[i] for i in order]
+    return brute_force
+
+@pytest.fixture(scope='session')
+def brute_force_range():
+    """brute_force_range(data_points, bbox, predicates=None) -> all pts inside bbox (in input order)."""
+    from attribute_filters import matches
+
+    def brute_force_range(data_points, bbox, predicates=None):
+        return [p for p in data_points if bbox[0] <= p.longitude <= bbox[2] and bbox[1] <= p.latitude <= bbox[3]
+                and (not predicates or matches(p, predicates))]
+    return brute_force_range
@@ -0,0 +1,68 @@
+"""
+Filtered k-NN / range queries should match brute force w/ the same predicates.
+"""
+
+import pytest
+import numpy as np
+from attribute_filters import matches, may_match, merge_summaries, point_summary
+from r_tree import RTree
+from kd_tree import ApproximateKDTree
+
+
+timezones = ['America/New_York', 'America/Chicago', 'America/Denver']
+predicates = [('population', '>', 40_000), ('timezone', '==', 'America/New_York')]
+
+
+@pytest.fixture(scope='module')
+def data_points(make_points):
+    data_points = make_points(1000)
+    populations = np.random.default_rng(1).integers(0, 50_000, len(data_points))
+    for i, (p, pop) in enumerate(zip(data_points, populations)):
+        if i % 10:
+            p.attributes = {'population': int(pop), 'timezone': timezones[i % 3]}
+    return data_points
+
+def test_summaries(data_points):
+    summary = merge_summaries(point_summary(p) for p in data_points[1:4])
+    assert summary['timezone'] == ('cat', set(timezones[1:] + timezones[:1]))
+    assert may_match(summary, [('population', '>=', summary['population'][2])])
+    assert not may_match(summary, [('population', '>', summary['population'][2])])
+    assert not may_match(summary, [('missing', '==', 1)])
+    assert not matches(data_points[0], predicates), "Pts w/o the attribute never match"
+
+@pytest.mark.parametrize("engine, params", [(RTree, {'max_children': 8}), (ApproximateKDTree, {'max_depth': 32})])
+def test_filtered_queries(engine, params, data_points, brute_force, brute_force_range):
+    index = engine.build(data_points, **params)
+    q = [-71.06, 42.36]
+    expected = brute_force(data_points, q, 5, predicates)
+    assert [p.zip_code for p in index.query(q, 5, predicates=predicates)] == [p.zip_code for p in expected]
+
+    bbox = (-71.5, 41.5, -70.5, 42.5)
+    expected = {p.zip_code for p in brute_force_range(data_points, bbox, predicates)}
+    assert {p.zip_code for p in index.range_query(bbox, predicates=predicates)} == expected
+    assert index.query(q, 5, predicates=[('population', '>', 10**9)]) == []
+
+def test_incremental_summaries_match_recomputed(data_points):
+    index = RTree.build(data_points, max_children=8)
+    stack = [index.root]
+    while stack:
+        node = stack.pop()
+        incremental = node.summary
+        node.compute_summary()
+        assert incremental == node.summary
+        if not node.is_leaf:
+            stack.extend(ch['node'] for ch in node.children)
+
+def test_pbf_attributes(tmp_path):
+    import osmium
+    from data_importers import DataIngestionFactory
+    path = str(tmp_path / "sample.osm.pbf")
+    writer = osmium.SimpleWriter(path)
+    writer.add_node(osmium.osm.mutable.Node(id=1, location=(-71.06, 42.36),
+                                            tags={'zip_code': '02108', 'population': '4000'}))
+    writer.add_node(osmium.osm.mutable.Node(id=2, location=(-71.07, 42.35), tags={'zip_code': '02116'}))
+    writer.close()
+
+    points = DataIngestionFactory.load_data(path, attributes=('population',))
+    assert [p.attributes for p in points] == [{'population': 4000}, {'population': None}]
+    assert DataIngestionFactory.load_data(path)[0].attributes is None
@@ -0,0 +1,37 @@
+"""
+Auto tuner should pick a config meeting the recall target and be able to rebuild it.
+"""
+
+import pytest
+from auto_tuner import auto_tune, build_tuned
+
+
+def test_auto_tune(make_points, tmp_path):
+    data_points = make_points(300)
+    path = str(tmp_path / "tuned.json")
+    best = auto_tune(data_points, target_recall=1.0, num_queries=10, engines=['grid', 'kd_tree'], output_path=path)
+    assert best['recall'] == 1.0
+    assert best['engine'] in ('grid', 'kd_tree')
+
+    index = build_tuned(data_points, path)
+    assert index.name == best['engine']
+    assert index.params == best['params']
+
+def test_auto_tune_closes_indexes(make_points, monkeypatch):
+    import multiprocessing as mp
+    from sharded_index import ShardedIndex
+    monkeypatch.setattr(ShardedIndex, 'tuning_params', {'workers': [2]})
+    best = auto_tune(make_points(300), target_recall=1.0, num_queries=10, engines=['sharded'])
+    assert best['params']['workers'] == 2
+    assert not mp.active_children(), "Worker processes should be stopped after scoring"
+
+def test_auto_tune_needs_engines(make_points):
+    with pytest.raises(ValueError):
+        auto_tune(make_points(100), engines=[])
+
+def test_ground_truth_sets(make_points, brute_force):
+    from benchmark import ground_truth_sets
+    data_points = make_points(300)
+    query_points = data_points[:10]
+    expected = [{p.zip_code for p in brute_force(data_points, q, 5)} for q in query_points]
+    assert ground_truth_sets(data_points, query_points, 5) == expected
@@ -0,0 +1,51 @@
+"""
+Conversion of a tiny generated .pbf to .csv and columnar .npz.
+"""
+
+import csv
+import pytest
+import osmium
+from data_converters import PBFToCSVConverter, load_columnar
+
+
+@pytest.fixture
+def pbf_file(tmp_path):
+    path = str(tmp_path / "sample.osm.pbf")
+    writer = osmium.SimpleWriter(path)
+    writer.add_node(osmium.osm.mutable.Node(id=1, location=(-64.92, 18.34), tags={'zip_code': '00802'}))
+    writer.add_node(osmium.osm.mutable.Node(id=2, location=(-64.93, 18.35), tags={'name': 'no zip'}))
+    writer.add_node(osmium.osm.mutable.Node(id=3, location=(-71.06, 42.36), tags={'zip_code': '02108'}))
+    writer.close()
+    return path
+
+def test_convert(pbf_file, tmp_path):
+    out_csv, out_npz = str(tmp_path / "out.csv"), str(tmp_path / "out.npz")
+    converter = PBFToCSVConverter(pbf_file, out_csv, out_npz, batch_size=1)
+    assert converter.convert() == 2, "Should only keep nodes w/ a zip_code tag"
+
+    with open(out_csv) as f:
+        rows = list(csv.DictReader(f))
+    assert [r['zip_code'] for r in rows] == ['00802', '02108']
+
+    columns = load_columnar(out_npz)
+    assert list(columns['zip_code']) == ['00802', '02108']
+    assert columns['latitude'][1] == pytest.approx(42.36)
+
+def test_bbox(pbf_file, tmp_path):
+    out_csv = str(tmp_path / "out.csv")
+    converter = PBFToCSVConverter(pbf_file, out_csv, bbox=(-65.0, 18.0, -64.0, 19.0))
+    assert converter.convert() == 1
+
+def test_bad_output_path(pbf_file, tmp_path):
+    converter = PBFToCSVConverter(pbf_file, str(tmp_path / "missing_dir" / "out.csv"))
+    with pytest.raises(FileNotFoundError):
+        converter.convert()
+
+def test_writer_error(pbf_file, tmp_path, monkeypatch):
+    def failing_write_batch(self, columns):
+        raise OSError("disk full")
+
+    monkeypatch.setattr('data_converters.ColumnarWriter.write_batch', failing_write_batch)
+    converter = PBFToCSVConverter(pbf_file, output_columnar=str(tmp_path / "out.npz"), batch_size=1)
+    with pytest.raises(OSError, match="disk full"):
+        converter.convert()
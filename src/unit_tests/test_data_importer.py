@@ -1,3 +1,67 @@
 """
-TODO: Fill in
+Tests for data_importers (only the spatial ordering so far...)
 """
+
+import numpy as np
+from data_importers import DataPoint, spatially_sorted, hilbert_keys
+
+
+data_points = [DataPoint(latitude=lat, longitude=lon, zip_code=str(i), point_id=i)
+               for i, (lon, lat) in enumerate([(-71.0, 42.0), (-64.9, 18.3), (-71.1, 42.1), (-64.8, 18.4)])]
+
+
+def test_spatially_sorted_permutation():
+    for curve in ('hilbert', 'morton'):
+        sorted_points, permutation = spatially_sorted(data_points, curve=curve)
+        assert [p.point_id for p in sorted_points] == list(permutation), "Permutation should map back to input"
+        # the two Boston pts and the two Virgin Islands pts should end up adjacent
+        groups = [p.latitude > 30 for p in sorted_points]
+        assert groups in ([True, True, False, False], [False, False, True, True])
+
+def test_hilbert_keys_are_continuous():
+    coords = np.array([[x, y] for y in range(4) for x in range(4)], dtype=float)
+    keys = hilbert_keys(coords, bits=2)
+    by_key = coords[np.argsort(keys)]
+    steps = np.abs(np.diff(by_key, axis=0)).sum(axis=1)
+    assert np.all(steps == 1), "Consecutive Hilbert keys should be neighboring cells"
+
+def test_fast_csv_loader(tmp_path):
+    import gzip
+    from data_importers import DataIngestionFactory, CSV_CACHE_SUFFIX
+    text = '"zip","city","lat","lng"\n"00601","Adjuntas","18.18027","-66.75266"\n"00602","Aguada, PR","18.36075","-67.17541"\n'
+    csv_path, gz_path = str(tmp_path / "zips.csv"), str(tmp_path / "zips.csv.gz")
+    with open(csv_path, 'w') as f:
+        f.write(text)
+    with gzip.open(gz_path, 'wt') as f:
+        f.write(text)
+
+    for path in (csv_path, gz_path, csv_path):  # 2nd read of csv_path comes from the cache
+        points = DataIngestionFactory.load_data(path)
+        assert [(p.zip_code, p.latitude, p.longitude, p.point_id) for p in points] == \
+               [('00601', 18.18027, -66.75266, 0), ('00602', 18.36075, -67.17541, 1)]
+    assert (tmp_path / ("zips.csv" + CSV_CACHE_SUFFIX)).exists()
+
+def test_csv_cache_write_failure_is_not_fatal(tmp_path, monkeypatch):
+    from data_importers import DataIngestionFactory
+    csv_path = str(tmp_path / "zips.csv")
+    with open(csv_path, 'w') as f:
+        f.write('zip,lat,lng\n00601,18.18027,-66.75266\n')
+
+    def failing_savez(*args, **kwargs):
+        raise OSError("read-only file system")
+    monkeypatch.setattr(np, 'savez', failing_savez)
+    columns = DataIngestionFactory.load_csv_columns(csv_path)
+    assert list(columns['zip']) == ['00601']
+    assert sorted(p.name for p in tmp_path.iterdir()) == ['zips.csv'], "No (partial) cache should be left behind"
+
+def test_fast_csv_loader_keeps_long_zip_codes(tmp_path):
+    from data_importers import DataIngestionFactory
+    csv_path = str(tmp_path / "postcodes.csv")
+    with open(csv_path, 'w') as f:
+        f.write('zip,lat,lng\nSW1A 1AA / WESTMINSTER,51.501,-0.1416\n00601,18.18027,-66.75266\n')
+
+    expected = [(p.zip_code, p.latitude, p.longitude) for p in DataIngestionFactory._load_from_csv(csv_path)]
+    assert expected[0][0] == 'SW1A 1AA / WESTMINSTER'
+    for _ in range(2):  # parsed, then from the cache
+        points = DataIngestionFactory._load_from_csv_fast(csv_path)
+        assert [(p.zip_code, p.latitude, p.longitude) for p in points] == expected
@@ -0,0 +1,66 @@
+"""
+Grid index results should match brute force exactly.
+"""
+
+import pytest
+import numpy as np
+from grid_index import GridIndex
+from spatial_index import decode_coords, EXACT
+from data_importers import DataPoint
+
+
+@pytest.fixture(scope='module')
+def data_points(make_points):
+    return make_points(2000)
+
+@pytest.mark.parametrize("lon, lat", [(-71.06, 42.36), (-70.0, 41.0), (-80.0, 50.0)])
+def test_query_matches_brute_force(lon, lat, data_points, brute_force):
+    grid = GridIndex(data_points)
+    query_point = DataPoint(latitude=lat, longitude=lon, zip_code=None)
+    expected = [p.zip_code for p in brute_force(data_points, query_point, 5)]
+    assert [p.zip_code for p in grid.query(query_point, 5)] == expected
+    assert [p.zip_code for p in grid.query([lon, lat], 5)] == expected
+
+def test_more_neighbors_than_points(data_points):
+    grid = GridIndex(data_points[:3])
+    assert len(grid.query([-71.0, 42.0], 10)) == 3
+
+def test_only_hits_are_materialized(data_points):
+    grid = GridIndex(data_points)
+    assert not hasattr(grid, 'points'), "Pts should live in arrays, not DataPoint objects"
+    hit = grid.query([data_points[7].longitude, data_points[7].latitude], 1)[0]
+    assert (hit.zip_code, hit.latitude, hit.longitude) == \
+           (data_points[7].zip_code, data_points[7].latitude, data_points[7].longitude)
+
+@pytest.mark.parametrize("precision", ['float32', 'int32'])
+def test_reduced_precision(precision, data_points, brute_force):
+    # 6 decimals (~10cm) round trip exactly through int32 fixed-point, but not through float32
+    data_points = [DataPoint(latitude=round(p.latitude, 6), longitude=round(p.longitude, 6), zip_code=p.zip_code)
+                   for p in data_points]
+    grid = GridIndex(data_points, precision=precision)
+    assert grid.coords.nbytes == len(data_points) * 8, "Should store 2 x 4 bytes per pt"
+    assert grid.supports(EXACT) == (precision == 'int32')
+    for lon, lat in [(-71.06, 42.36), (-70.5, 41.7)]:
+        query_point = DataPoint(latitude=lat, longitude=lon, zip_code=None)
+        expected = [p.zip_code for p in brute_force(data_points, query_point, 5)]
+        assert [p.zip_code for p in grid.query(query_point, 5)] == expected
+
+def test_query_outside_grid_stops_early(data_points, brute_force, monkeypatch):
+    grid = GridIndex(data_points)
+    rings = []
+    ring_indices = GridIndex._ring_indices
+    def counting_ring_indices(self, cx, cy, r):
+        rings.append(r)
+        return ring_indices(self, cx, cy, r)
+    monkeypatch.setattr(GridIndex, '_ring_indices', counting_ring_indices)
+
+    expected = [p.zip_code for p in brute_force(data_points, [-65.0, 42.0], 5)]
+    assert [p.zip_code for p in grid.query([-65.0, 42.0], 5)] == expected
+    # the query's cell is clipped to the east edge, so scanning the whole grid would take nx - 1 rings
+    assert max(rings) < grid.nx - 1, "Shouldn't scan the whole grid for a query east of it"
+
+@pytest.mark.parametrize("precision", ['float32', 'int32'])
+def test_stored_coords_are_in_their_cells(precision, make_points):
+    grid = GridIndex(make_points(20_000, seed=1), precision=precision)
+    cell_ids = grid._cell_ids(decode_coords(grid.coords, precision))
+    assert np.array_equal(np.searchsorted(grid.cell_offsets, np.arange(len(cell_ids)), side='right') - 1, cell_ids)
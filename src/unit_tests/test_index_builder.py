@@ -0,0 +1,92 @@
+"""
+Checkpointed builds should resume where they stopped and only index new rows on refresh.
+"""
+
+import csv
+import pytest
+from index_builder import CheckpointedIndexBuilder
+from r_tree import RTree
+
+
+def write_csv(path, rows):
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['zip', 'lat', 'lng'])
+        writer.writerows(rows)
+
+rows = [(f"{i:05d}", 40 + i * 0.01, -75 + i * 0.01) for i in range(50)]
+
+
+def test_resume_after_crash(tmp_path, monkeypatch):
+    csv_path, ckpt_path = str(tmp_path / "zips.csv"), str(tmp_path / "index.ckpt")
+    write_csv(csv_path, rows)
+
+    calls = []
+    original_insert = RTree.insert
+    def crashing_insert(self, points):
+        calls.extend([len(points)] if points else [])
+        if len(calls) == 3:
+            raise MemoryError("simulated crash")
+        original_insert(self, points)
+    monkeypatch.setattr(RTree, 'insert', crashing_insert)
+    with pytest.raises(MemoryError):
+        CheckpointedIndexBuilder(ckpt_path, checkpoint_every=10).add_source(csv_path)
+    monkeypatch.setattr(RTree, 'insert', original_insert)
+
+    builder = CheckpointedIndexBuilder(ckpt_path, checkpoint_every=10)
+    assert builder.index.num_points == 20, "Should resume from the last checkpoint"
+    index = builder.add_source(csv_path)
+    assert index.num_points == 50
+    assert sorted(p.zip_code for p in index.range_query((-180, -90, 180, 90))) == [r[0] for r in rows]
+
+def test_append_delta(tmp_path):
+    csv_path, ckpt_path = str(tmp_path / "zips.csv"), str(tmp_path / "index.ckpt")
+    write_csv(csv_path, rows[:30])
+    CheckpointedIndexBuilder(ckpt_path).add_source(csv_path)
+
+    write_csv(csv_path, rows)  # 20 rows appended
+    index = CheckpointedIndexBuilder(ckpt_path).add_source(csv_path)
+    assert index.num_points == 50
+    assert len({p.zip_code for p in index.range_query((-180, -90, 180, 90))}) == 50
+
+def test_csv_delta_only_parses_new_rows(tmp_path, monkeypatch):
+    from data_importers import DataIngestionFactory
+    csv_path, ckpt_path = str(tmp_path / "zips.csv"), str(tmp_path / "index.ckpt")
+    write_csv(csv_path, rows[:30])
+    CheckpointedIndexBuilder(ckpt_path).add_source(csv_path)
+
+    parsed = []
+    read_csv_columns_from = DataIngestionFactory.read_csv_columns_from
+    def counting_read(file_path, offset=0):
+        columns, end = read_csv_columns_from(file_path, offset)
+        parsed.append(len(columns['zip']))
+        return columns, end
+    monkeypatch.setattr(DataIngestionFactory, 'read_csv_columns_from', counting_read)
+
+    with open(csv_path, 'a', newline='') as f:
+        csv.writer(f).writerows(rows[30:])
+        f.write("99999,40.0")  # half written row, picked up next time
+    index = CheckpointedIndexBuilder(ckpt_path).add_source(csv_path)
+    assert parsed == [20], "Should only parse the complete rows past the recorded offset"
+    assert index.num_points == 50
+
+def test_pbf_delta(tmp_path):
+    import osmium
+
+    def write_pbf(path, node_ids):
+        writer = osmium.SimpleWriter(path)
+        for i in node_ids:
+            writer.add_node(osmium.osm.mutable.Node(id=i, location=(-75 + i * 0.01, 40 + i * 0.01),
+                                                    tags={'zip_code': f"{i:05d}"}))
+        writer.close()
+
+    ckpt_path = str(tmp_path / "index.ckpt")
+    write_pbf(str(tmp_path / "old.osm.pbf"), range(1, 31))
+    CheckpointedIndexBuilder(ckpt_path, checkpoint_every=10).add_source(str(tmp_path / "old.osm.pbf"))
+
+    write_pbf(str(tmp_path / "new.osm.pbf"), range(11, 51))  # 20 known ids, 20 new ones
+    builder = CheckpointedIndexBuilder(ckpt_path, checkpoint_every=10)
+    index = builder.add_source(str(tmp_path / "new.osm.pbf"))
+    assert index.num_points == 50
+    assert sorted(p.point_id for p in index.range_query((-180, -90, 180, 90))) == list(range(1, 51))
+    assert list(builder.state['osm_ids']) == list(range(1, 51))
@@ -0,0 +1,74 @@
+"""
+Async logging: delivery, traceback formatting, sampling, rotation, and reconfiguring.
+"""
+
+import os
+import logging
+import pytest
+from utils import logger
+
+
+@pytest.fixture
+def logs_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(logger, 'logs_dir', str(tmp_path))
+    root = logging.getLogger()
+    handlers, level = list(root.handlers), root.level
+    yield tmp_path
+    logger.stop_listener()
+    for handler in root.handlers[:]:
+        if handler not in handlers:
+            root.removeHandler(handler)
+            handler.close()
+    root.setLevel(level)
+
+def read_log(logs_dir, name="test"):
+    with open(os.path.join(logs_dir, f"logs_{name}.log")) as f:
+        return f.read()
+
+def test_async_delivery_and_sampling(logs_dir):
+    logger.config_logger("test", overwrite=True, async_mode=True, sample_rates={logging.DEBUG: 0.0})
+    logging.debug("dropped by sampling")
+    logging.info("delivered")
+    try:
+        1 / 0
+    except ZeroDivisionError:
+        logging.exception("failed")
+    logger.stop_listener()
+
+    text = read_log(logs_dir)
+    assert "delivered" in text
+    assert "dropped by sampling" not in text
+    assert "failed" in text and "ZeroDivisionError: division by zero" in text
+
+def test_rotation(logs_dir):
+    logger.config_logger("test", overwrite=True, async_mode=True, max_bytes=200, backup_count=2)
+    for i in range(50):
+        logging.info(f"line {i}")
+    logger.stop_listener()
+    assert os.path.exists(os.path.join(logs_dir, "logs_test.log.1")), "Should have rotated"
+
+def test_reconfigure_replaces_queue_handler(logs_dir):
+    logger.config_logger("test", overwrite=True, async_mode=True)
+    logger.config_logger("test", overwrite=True, async_mode=True)
+    queue_handlers = [h for h in logging.getLogger().handlers if isinstance(h, logging.handlers.QueueHandler)]
+    assert len(queue_handlers) == 1
+    logger.stop_listener()
+    assert not [h for h in logging.getLogger().handlers if isinstance(h, logging.handlers.QueueHandler)]
+
+def test_rotating_overwrite_truncates(logs_dir):
+    with open(os.path.join(logs_dir, "logs_test.log"), 'w') as f:
+        f.write("old run\n")
+    logger.config_logger("test", overwrite=True, async_mode=True, max_bytes=10_000)
+    logging.info("new run")
+    logger.stop_listener()
+    text = read_log(logs_dir)
+    assert "new run" in text and "old run" not in text
+
+def test_sync_sampling_is_shared_by_handlers(logs_dir, capsys):
+    logger.config_logger("test", overwrite=True, sample_rates={logging.DEBUG: 0.5})
+    for i in range(200):
+        logging.debug(f"sample {i}")
+    kept_in_file = {line.rsplit(' ', 1)[-1] for line in read_log(logs_dir).splitlines() if "sample" in line}
+    kept_on_console = {line.rsplit(' ', 1)[-1] for line in capsys.readouterr().err.splitlines() if "sample" in line}
+    assert 0 < len(kept_in_file) < 200
+    assert kept_in_file == kept_on_console, "Console and file should keep the same sampled records"
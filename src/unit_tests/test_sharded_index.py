@@ -0,0 +1,48 @@
+"""
+Sharded index should give the same results as brute force while only visiting nearby shards.
+"""
+
+import pytest
+from sharded_index import ShardedIndex
+from spatial_index import UnsupportedOperation, EXACT, RANGE
+
+
+@pytest.fixture(scope='module')
+def data_points(make_points):
+    return make_points(4000, lon_range=(-120, -70), lat_range=(25, 48))
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_query_matches_brute_force(workers, data_points, brute_force):
+    with ShardedIndex.build(data_points, num_shards=8, workers=workers) as index:
+        assert index.stats()['num_points'] == len(data_points)
+        expected = [p.zip_code for p in brute_force(data_points, [-100.0, 35.0], 5)]
+        results, visited = index._query([-100.0, 35.0], 5)
+        assert [p.zip_code for p in results] == expected
+        assert [p.zip_code for p in index.query([-100.0, 35.0], 5)] == expected
+        assert visited < 8, "Shouldn't need to visit every shard"
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_range_query(workers, data_points, brute_force_range):
+    with ShardedIndex.build(data_points, num_shards=4, workers=workers) as index:
+        bbox = (-110.0, 30.0, -90.0, 40.0)
+        expected = {p.zip_code for p in brute_force_range(data_points, bbox)}
+        assert {p.zip_code for p in index.range_query(bbox)} == expected
+
+def test_capabilities_follow_base_engine(data_points):
+    with ShardedIndex.build(data_points[:200], base_engine='lsh', num_shards=2, workers=1) as index:
+        assert not index.supports(EXACT) and not index.supports(RANGE)
+        with pytest.raises(UnsupportedOperation):
+            index.range_query((-110.0, 30.0, -90.0, 40.0))
+
+def test_failed_request_does_not_leak_replies(data_points, brute_force):
+    with ShardedIndex.build(data_points, num_shards=4, workers=2) as index:
+        with pytest.raises(Exception):
+            index._ask('bogus', range(4))
+        expected = [p.zip_code for p in brute_force(data_points, [-100.0, 35.0], 5)]
+        assert [p.zip_code for p in index.query([-100.0, 35.0], 5)] == expected
+
+def test_workers_stopped_when_index_is_dropped(data_points):
+    index = ShardedIndex.build(data_points[:200], num_shards=2, workers=2)
+    processes = [host.process for host in index.hosts]
+    del index
+    assert not any(p.is_alive() for p in processes)
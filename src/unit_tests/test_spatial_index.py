@@ -0,0 +1,55 @@
+"""
+Every registered engine should work through the common SpatialIndex interface.
+"""
+
+import pytest
+from spatial_index import SpatialIndex, UnsupportedOperation, available_engines, get_engine, EXACT, RANGE, INSERT, PERSIST
+
+
+bbox = (-71.5, 41.5, -71.0, 42.0)
+
+
+def test_registry():
+    names = available_engines()
+    assert {'r_tree', 'kd_tree', 'lsh', 'grid'} <= set(names)
+    assert set(available_engines(RANGE)) <= set(names)
+    with pytest.raises(ValueError):
+        get_engine('no_such_engine')
+
+@pytest.mark.parametrize("name", available_engines())
+def test_build_and_query(name, data_points, tmp_path):
+    index = get_engine(name).build(data_points)
+    assert isinstance(index, SpatialIndex)
+    assert len(index.query([-71.06, 42.36], 5)) <= 5
+    assert len(index.batch_query([data_points[0], [-71.0, 42.0]], 3)) == 2
+    assert index.stats()['engine'] == name
+
+    path = str(tmp_path / "index.pkl")
+    if index.supports(PERSIST):
+        index.save(path)
+        assert type(get_engine(name).load(path)) is type(index)
+    else:
+        with pytest.raises(UnsupportedOperation):
+            index.save(path)
+
+@pytest.mark.parametrize("name", available_engines(EXACT))
+def test_exact_engines(name, data_points, brute_force):
+    index = get_engine(name).build(data_points)
+    expected = brute_force(data_points, [-71.06, 42.36], 5)
+    assert [p.zip_code for p in index.query([-71.06, 42.36], 5)] == [p.zip_code for p in expected]
+
+@pytest.mark.parametrize("name", available_engines(RANGE))
+def test_range_query(name, data_points, brute_force_range):
+    index = get_engine(name).build(data_points)
+    expected = {p.zip_code for p in brute_force_range(data_points, bbox)}
+    assert {p.zip_code for p in index.range_query(bbox)} == expected
+
+@pytest.mark.parametrize("name", available_engines())
+def test_unsupported_operations(name, data_points):
+    index = get_engine(name).build(data_points[:50])
+    if not index.supports(RANGE):
+        with pytest.raises(UnsupportedOperation):
+            index.range_query(bbox)
+    if not index.supports(INSERT):
+        with pytest.raises(UnsupportedOperation):
+            index.insert(data_points[50:60])
@@ -6,16 +6,22 @@ Levels include: debug, info, warning, error, critical.
 
 import os
 import sys
+import queue
+import atexit
+import random
 import logging
 import threading
-from traceback import format_exc
+from traceback import format_exception
 from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 
 from config import ROOT_DIR
 logs_dir = os.path.join(ROOT_DIR, 'logs')
 os.makedirs(logs_dir, exist_ok=True)
 
 context_data = threading.local()  # can be injected into logs via ContextFilter
+_listener = None                  # background writer thread when config_logger(async_mode=True)
+_queue_handler = None             # the root logger's handler feeding _listener
 
 
 class ContextFilter(logging.Filter):
@@ -30,10 +36,52 @@ class ContextFilter(logging.Filter):
     def filter(self, record):
         for a in self.attributes:
             setattr(record, a, getattr(context_data, a, ''))
-        setattr(record, 'traceback', format_exc())
+        # only format a traceback when the record actually carries one (formatting is expensive in hot loops)
+        if record.exc_info and record.exc_info[0] is not None:
+            setattr(record, 'traceback', ''.join(format_exception(*record.exc_info)))
+        else:
+            setattr(record, 'traceback', '')
         return True
 
 
+class SamplingFilter(logging.Filter):
+    """
+    Drops a fraction of records per level, e.g. {logging.DEBUG: 0.01} keeps ~1% of debug logs.
+    Levels not listed (and anything carrying exc_info) always pass.
+    The decision is stored on the record, so one filter shared by several handlers keeps the same records in all.
+    """
+
+    def __init__(self, rates: dict[int, float] = None):
+        super().__init__()
+        self.rates = rates or {}
+
+    def filter(self, record):
+        rate = self.rates.get(record.levelno)
+        if rate is None or record.exc_info:
+            return True
+        keep = getattr(record, 'sampled', None)
+        if keep is None:
+            keep = record.sampled = random.random() < rate
+        return keep
+
+
+class _ContextQueueHandler(QueueHandler):
+    """
+    QueueHandler that injects context on the calling thread (threading.local isn't visible from the listener).
+    Tracebacks are formatted here too, on the calling thread, but only for records that carry exc_info;
+    everything else (formatting the line, writing it) happens on the writer thread.
+    """
+
+    def prepare(self, record):
+        for a in getattr(self, 'attributes', ()):
+            setattr(record, a, getattr(context_data, a, ''))
+        if record.exc_info and record.exc_info[0] is not None:
+            record.exc_text = ''.join(format_exception(*record.exc_info))
+        record.message = record.getMessage()
+        record.msg, record.args, record.exc_info = record.message, None, None
+        return record
+
+
 def handle_exception(exc_type, exc_value, exc_traceback):
     """
     Code that runs when an exception is uncaught.
@@ -47,10 +95,17 @@ def handle_exception(exc_type, exc_value, exc_traceback):
                          exc_info=(exc_type, exc_value, exc_traceback))
 
 
-def config_logger(descriptor="", time=True, thread=True, level=True, overwrite=False):
+def config_logger(descriptor="", time=True, thread=True, level=True, overwrite=False,
+                  async_mode=False, max_bytes=0, backup_count=5, sample_rates=None, attributes=()):
     """
     Initializes the loggers. logging.[debug | info | warning | error | critical] will print to console and save to log.
+
+    async_mode:   callers only enqueue records; a background QueueListener thread formats and writes them.
+    max_bytes:    if > 0, rotate the log file once it reaches this size (keeping `backup_count` old files).
+    sample_rates: per-level keep probability, e.g. {logging.DEBUG: 0.01}, for hot-path debug logs.
+    attributes:   names in `context_data` to inject into every record.
     """
+    global _listener, _queue_handler
 
     descriptor = f"_{descriptor}" if descriptor else ""
     time_suffix = "" if overwrite else datetime.now().strftime("_%Y-%m-%d_%H%M%S")
@@ -58,7 +113,7 @@ def config_logger(descriptor="", time=True, thread=True, level=True, overwrite=F
 
     # Root logger
     root_logger = logging.getLogger()
-    root_logger.level = logging.DEBUG  # default: logging.WARNING
+    root_logger.setLevel(logging.DEBUG)  # default: logging.WARNING (setLevel also resets the isEnabledFor cache)
     logs_formatter = logging.Formatter(f"{'%(asctime).16s '   if time   else ''}"
                                        f"{'%(threadName).11s ' if thread else ''}"
                                        f"{'%(levelname).8s ' if level  else ''}"
@@ -67,16 +122,56 @@ def config_logger(descriptor="", time=True, thread=True, level=True, overwrite=F
     # Console logger
     cons_handler = logging.StreamHandler()
     # cons_handler.setFormatter(logs_formatter)
-    cons_handler.addFilter(ContextFilter())
-    root_logger.addHandler(cons_handler)
 
     # File logger
-    file_handler = logging.FileHandler(log_file_name, 'w+' if overwrite else 'a')
+    if max_bytes > 0:
+        if overwrite:
+            open(log_file_name, 'w').close()  # RotatingFileHandler always appends, so truncate it here
+        file_handler = RotatingFileHandler(log_file_name, 'a', maxBytes=max_bytes, backupCount=backup_count)
+    else:
+        file_handler = logging.FileHandler(log_file_name, 'w+' if overwrite else 'a')
     file_handler.setFormatter(logs_formatter)
-    file_handler.addFilter(ContextFilter())
-    root_logger.addHandler(file_handler)
+
+    if async_mode:
+        # Callers only pay for a queue put; context is captured here, writing happens on the listener thread
+        stop_listener()  # also detaches the previous queue handler, if reconfiguring
+        log_queue = queue.SimpleQueue()
+        _queue_handler = _ContextQueueHandler(log_queue)
+        _queue_handler.attributes = attributes
+        if sample_rates:
+            _queue_handler.addFilter(SamplingFilter(sample_rates))
+        root_logger.addHandler(_queue_handler)
+
+        _listener = QueueListener(log_queue, cons_handler, file_handler, respect_handler_level=True)
+        _listener.start()
+    else:
+        sampling_filter = SamplingFilter(sample_rates) if sample_rates else None  # shared: same sample everywhere
+        for handler in (cons_handler, file_handler):
+            if sampling_filter:
+                handler.addFilter(sampling_filter)
+            handler.addFilter(ContextFilter(attributes))
+            root_logger.addHandler(handler)
 
     # other settings
     # sys.excepthook = handle_exception                             # Function runs when an exception is uncaught
     # sys.stdout = Logger(log_file_name)                            # Redirect standard out to the log file
     # logging.getLogger('matplotlib.font_manager').disabled = True  # Can disable to avoid potential clutter
+
+
+def stop_listener():
+    """
+    Flushes and stops the background writer thread (if async logging was configured) and detaches its queue handler.
+    """
+
+    global _listener, _queue_handler
+    if _queue_handler is not None:
+        logging.getLogger().removeHandler(_queue_handler)
+        _queue_handler = None
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
+
+
+atexit.register(stop_listener)